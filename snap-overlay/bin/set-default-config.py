@@ -34,6 +34,8 @@ def _get_default_config():
         'config.network.compute-ip': '192.168.0.1',
         'config.network.ext-cidr': '192.168.0.159/24',
         'config.network.security-rules': True,
+        # Set once the default security group rules have been created.
+        'config.network.security-rules-created': False,
         'config.network.dashboard-allowed-hosts': '*',
         'config.network.ports.dashboard': 80,
         'config.network.ports.mysql': 3306,
@@ -1,14 +1,28 @@
+import atexit
+import functools
 import logging
 import json
+import os
 import unittest
 import subprocess
+import threading
 import yaml
 
+from concurrent.futures import ThreadPoolExecutor
+
 import petname
 import tenacity
 from selenium import webdriver
 from selenium.webdriver.firefox.options import Options as FirefoxOptions
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Prefer the libyaml-based dumper when PyYAML has been built with it.
+try:
+    from yaml import CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
 
 
 # Setup logging
@@ -20,30 +34,66 @@ formatter = logging.Formatter(
 stream.setFormatter(formatter)
 logger.addHandler(stream)
 
+# Hosts may be launched concurrently by tests: serialize the steps that
+# touch global host state such as the page cache.
+_host_state_lock = threading.Lock()
+
+
+_driver = None
+
+
+def _get_driver():
+    """Get a Selenium driver, starting one up on first use.
+
+    Starting Firefox is slow so a single driver is shared by all of the
+    tests run by this process and torn down on exit.
+    """
+    global _driver
+    if _driver is None:
+        options = FirefoxOptions()
+        options.add_argument("-headless")
+        _driver = webdriver.Firefox(options=options)
+        atexit.register(_driver.quit)
+    return _driver
+
 
 def gui_wrapper(func):
-    """Start up selenium drivers, run a test, then tear them down."""
+    """Set up a selenium driver with a clean session, then run a test."""
 
     def wrapper(cls, *args, **kwargs):
 
         # Setup Selenium Driver
-        options = FirefoxOptions()
-        options.add_argument("-headless")
-        cls.driver = webdriver.Firefox(options=options)
+        cls.driver = _get_driver()
+        cls.driver.delete_all_cookies()
 
         # Run function
-        try:
-            return func(cls, *args, **kwargs)
-
-        finally:
-            # Tear down driver
-            cls.driver.quit()
+        return func(cls, *args, **kwargs)
 
     return wrapper
 
 
+def gather(procs):
+    """Wait for processes started via TestHost.popen to complete.
+
+    :param list procs: Popen objects returned by TestHost.popen.
+    :return: stripped stdout of each process in the order of procs.
+    :raises subprocess.CalledProcessError: if any process has failed.
+    """
+    outputs = []
+    for proc in procs:
+        stdout, stderr = proc.communicate()
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args,
+                                                stdout, stderr)
+        outputs.append(stdout.strip())
+    return outputs
+
+
 class TestHost:
 
+    # Prepended to every command executed at the host.
+    _prefix = ()
+
     def __init__(self):
         pass
 
@@ -51,6 +101,7 @@ class TestHost:
         raise NotImplementedError
 
     def check_output(self, args, **kwargs):
+        """Run a command at the host and return its output as text."""
         raise NotImplementedError
 
     def call(self, args, **kwargs):
@@ -59,19 +110,47 @@ class TestHost:
     def check_call(self, args, **kwargs):
         raise NotImplementedError
 
+    def popen(self, args, **kwargs):
+        """Start a command at the host without waiting for it to complete.
+
+        Use gather to collect the results of several such commands so that
+        independent commands run concurrently.
+        """
+        kwargs.setdefault('text', True)
+        return subprocess.Popen((*self._prefix, *args),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, **kwargs)
+
     def install_snap(self, name, options):
         self.check_output(['sudo', 'snap', 'install', name, *options])
 
     def remove_snap(self, name, options):
         self.check_output(['sudo', 'snap', 'remove', name, *options])
 
+    # snapd rejects changes that conflict with other in-progress changes
+    # for the same snap so retry when connections are made concurrently.
+    @tenacity.retry(wait=tenacity.wait_fixed(1),
+                    stop=tenacity.stop_after_attempt(5),
+                    reraise=True)
     def snap_connect(self, snap_name, plug_name):
         self.check_output(['sudo', 'snap', 'connect',
                           f'{snap_name}:{plug_name}'])
 
+    @functools.cached_property
+    def control_ip(self):
+        """The control IP of the MicroStack installed at this host.
+
+        The value is fetched once per installation.
+        """
+        return self.check_output([
+            'sudo', 'snap', 'get', 'microstack', 'config.network.control-ip',
+        ])
+
     def install_microstack(self, *, channel='edge', path=None):
         """Install MicroStack at this host and connect relevant plugs.
         """
+        # A new installation may come with a different configuration.
+        self.__dict__.pop('control_ip', None)
         if path is not None:
             self.install_snap(path, ['--devmode'])
         else:
@@ -89,40 +168,51 @@ class TestHost:
                 'system-trace', 'block-devices',
                 'raw-usb'
         ]
-        for plug in plugs:
-            self.snap_connect('microstack', plug)
+        # Each connection is a separate snapd round-trip: overlap them.
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(self.snap_connect, 'microstack', plug)
+                       for plug in plugs]
+            for future in futures:
+                future.result()
 
     def init_microstack(self, args=['--auto']):
         self.check_call(['sudo', 'microstack', 'init', *args])
 
     def setup_tempest_verifier(self):
-        self.check_call(['sudo', 'snap', 'install', 'microstack-test'])
-        self.check_call(['sudo', 'mkdir', '-p',
-                        '/tmp/snap.microstack-test/tmp'])
-        self.check_call(['sudo', 'cp',
-                         '/var/snap/microstack/common/etc/microstack.json',
-                         '/tmp/snap.microstack-test/tmp/microstack.json'])
-        self.check_call(['microstack-test.rally', 'db', 'recreate'])
-        self.check_call([
-            'microstack-test.rally', 'deployment', 'create',
-            '--filename', '/tmp/microstack.json',
-            '--name', 'snap_generated'])
-        self.check_call(['microstack-test.tempest-init'])
+        # Chain the steps into scripts executed at the host to avoid a
+        # round-trip (possibly via multipass or lxc exec) per command. The
+        # rally commands are not run as root so that the rally database is
+        # created for the same user that runs verifications later.
+        self.check_call(['sudo', 'sh', '-c', ' && '.join([
+            'snap install microstack-test',
+            'mkdir -p /tmp/snap.microstack-test/tmp',
+            'cp /var/snap/microstack/common/etc/microstack.json'
+            ' /tmp/snap.microstack-test/tmp/microstack.json',
+        ])])
+        self.check_call(['sh', '-c', ' && '.join([
+            'microstack-test.rally db recreate',
+            'microstack-test.rally deployment create'
+            ' --filename /tmp/microstack.json --name snap_generated',
+            'microstack-test.tempest-init',
+        ])])
 
     def run_verifications(self):
         """Run a set of verification tests on MicroStack from this host."""
+        # Scale tempest workers with the CPUs available at the host where
+        # the tests run unless explicitly overridden.
+        concurrency = os.environ.get('MICROSTACK_TEMPEST_CONCURRENCY')
+        if concurrency is None:
+            cpus = int(self.check_output(['nproc']))
+            concurrency = str(max(2, min(cpus, 8)))
         self.check_call([
             'microstack-test.rally', 'verify', 'start',
             '--load-list',
             '/snap/microstack-test/current/2020.06-test-list.txt',
-            '--detailed', '--concurrency', '2'])
-        self.check_call([
-            'microstack-test.rally', 'verify', 'report',
-            '--type', 'json', '--to',
-            '/tmp/verification-report.json'])
+            '--detailed', '--concurrency', concurrency])
+        # Without --to the report is written to stdout which avoids reading
+        # it back from the snap's private /tmp.
         report = json.loads(self.check_output([
-            'sudo', 'cat',
-            '/tmp/snap.microstack-test/tmp/verification-report.json']))
+            'microstack-test.rally', 'verify', 'report', '--type', 'json']))
         # Make sure there are no verification failures in the report.
         failures = list(report['verifications'].values())[0]['failures']
         return failures
@@ -132,8 +222,12 @@ class LocalTestHost(TestHost):
 
     def __init__(self):
         super().__init__()
-        self.install_snap('multipass', ['--stable'])
-        self.install_snap('lxd', ['--stable'])
+        # Avoid snapd round-trips for snaps that are already present.
+        if self.call(['snap', 'list', 'multipass', 'lxd'],
+                     stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL) != 0:
+            self.install_snap('multipass', ['--stable'])
+            self.install_snap('lxd', ['--stable'])
         self.check_call(['sudo', 'lxd', 'init', '--auto'])
 
         try:
@@ -179,12 +273,14 @@ class LocalTestHost(TestHost):
                  stdout=subprocess.PIPE,
                  stderr=subprocess.PIPE,
                  check=True,
-                 input=yaml.dump(profile_conf).encode('utf-8'))
+                 input=yaml.dump(profile_conf,
+                                 Dumper=YamlDumper).encode('utf-8'))
 
     def destroy(self):
         self.remove_snap('microstack', ['--purge'])
 
     def check_output(self, args, **kwargs):
+        kwargs.setdefault('text', True)
         return subprocess.check_output(args, **kwargs).strip()
 
     def call(self, args, **kwargs):
@@ -203,35 +299,23 @@ class MultipassTestHost(TestHost):
     def __init__(self, distribution):
         self.distribution = distribution
         self.name = petname.generate()
+        # Built once: every command executed in the VM shares it.
+        self._prefix = ('sudo', 'multipass', 'exec', self.name, '--')
         self._launch()
 
     def check_output(self, args, **kwargs):
-        prefix = ['sudo', 'multipass', 'exec', self.name, '--']
-        cmd = []
-        cmd.extend(prefix)
-        cmd.extend(args)
-        return subprocess.check_output(cmd, **kwargs).strip()
+        kwargs.setdefault('text', True)
+        return subprocess.check_output((*self._prefix, *args),
+                                       **kwargs).strip()
 
     def call(self, args, **kwargs):
-        prefix = ['sudo', 'multipass', 'exec', self.name, '--']
-        cmd = []
-        cmd.extend(prefix)
-        cmd.extend(args)
-        return subprocess.call(cmd, **kwargs)
+        return subprocess.call((*self._prefix, *args), **kwargs)
 
     def check_call(self, args, **kwargs):
-        prefix = ['sudo', 'multipass', 'exec', self.name, '--']
-        cmd = []
-        cmd.extend(prefix)
-        cmd.extend(args)
-        subprocess.check_call(cmd, **kwargs)
+        subprocess.check_call((*self._prefix, *args), **kwargs)
 
     def run(self, args, **kwargs):
-        prefix = ['sudo', 'multipass', 'exec', self.name, '--']
-        cmd = []
-        cmd.extend(prefix)
-        cmd.extend(args)
-        subprocess.run(cmd, **kwargs)
+        subprocess.run((*self._prefix, *args), **kwargs)
 
     def _launch(self):
         # Possible upstream CI resource allocation is documented here:
@@ -241,9 +325,13 @@ class MultipassTestHost(TestHost):
         # Swap is not guaranteed.
         # With m1.tiny flavor the compute node needs slightly less than 3G of
         # RAM and 2.5G of disk space.
-        subprocess.check_call(['sudo', 'sync'])
-        subprocess.check_call(['sudo', 'sh', '-c',
-                               'echo 3 > /proc/sys/vm/drop_caches'])
+        # Dropping caches throws away the page cache warmed up by earlier
+        # launches (images, snaps) so only do it when explicitly asked to.
+        if os.environ.get('MICROSTACK_DROP_CACHES') == '1':
+            with _host_state_lock:
+                subprocess.check_call(['sudo', 'sync'])
+                subprocess.check_call(['sudo', 'sh', '-c',
+                                       'echo 3 > /proc/sys/vm/drop_caches'])
         subprocess.check_call(['sudo', 'multipass', 'launch', '--cpus', '2',
                                '--mem', '3G', '--disk', '4G',
                                self.distribution, '--name', self.name])
@@ -276,35 +364,23 @@ class LXDTestHost(TestHost):
     def __init__(self, distribution):
         self.distribution = distribution
         self.name = petname.generate()
+        # Built once: every command executed in the container shares it.
+        self._prefix = ('sudo', 'lxc', 'exec', self.name, '--')
         self._launch()
 
     def check_output(self, args, **kwargs):
-        prefix = ['sudo', 'lxc', 'exec', self.name, '--']
-        cmd = []
-        cmd.extend(prefix)
-        cmd.extend(args)
-        return subprocess.check_output(cmd, **kwargs).strip()
+        kwargs.setdefault('text', True)
+        return subprocess.check_output((*self._prefix, *args),
+                                       **kwargs).strip()
 
     def call(self, args, **kwargs):
-        prefix = ['sudo', 'lxc', 'exec', self.name, '--']
-        cmd = []
-        cmd.extend(prefix)
-        cmd.extend(args)
-        return subprocess.call(cmd, **kwargs)
+        return subprocess.call((*self._prefix, *args), **kwargs)
 
     def check_call(self, args, **kwargs):
-        prefix = ['sudo', 'lxc', 'exec', self.name, '--']
-        cmd = []
-        cmd.extend(prefix)
-        cmd.extend(args)
-        subprocess.check_call(cmd, **kwargs)
+        subprocess.check_call((*self._prefix, *args), **kwargs)
 
     def run(self, args, **kwargs):
-        prefix = ['sudo', 'lxc', 'exec', self.name, '--']
-        cmd = []
-        cmd.extend(prefix)
-        cmd.extend(args)
-        subprocess.check_call(cmd, **kwargs)
+        subprocess.check_call((*self._prefix, *args), **kwargs)
 
     def _launch(self):
         subprocess.check_call(['sudo', 'lxc', 'launch',
@@ -312,7 +388,10 @@ class LXDTestHost(TestHost):
                                '--profile', 'default',
                                '--profile', 'microstack'])
 
-        @tenacity.retry(wait=tenacity.wait_fixed(3))
+        # Probe often at first and back off if the address is slow to come.
+        @tenacity.retry(wait=tenacity.wait_exponential(multiplier=0.1,
+                                                       min=0.05, max=2),
+                        stop=tenacity.stop_after_delay(60))
         def fetch_addr_info():
             info = json.loads(subprocess.check_output(
                 ['sudo', 'lxc', 'query', f'/1.0/instances/{self.name}/state']))
@@ -350,8 +429,11 @@ class Framework(unittest.TestCase):
         super().__init__(*args, **kwargs)
         self._test_hosts = []
 
-    def setUp(self):
-        self._localhost = LocalTestHost()
+    @classmethod
+    def setUpClass(cls):
+        # Setting up the local host is costly (snaps, LXD profile) and its
+        # state does not change between tests so share it within a class.
+        cls._localhost = LocalTestHost()
 
     def tearDown(self):
         for host in self._test_hosts:
@@ -371,55 +453,75 @@ class Framework(unittest.TestCase):
         self._test_hosts.append(new_test_host)
         return new_test_host
 
-    def verify_instance_networking(self, test_host, instance_name):
-        """Verify that we have networking on an instance
+    def _has_iface(self, test_host, name):
+        """Check whether a network interface exists on a test host."""
+        return test_host.call(['ip', 'link', 'show', 'dev', name],
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL) == 0
+
+    def verify_instance_networking(self, test_host, *instance_names):
+        """Verify that we have networking on one or more instances
 
-        We should be able to ping the instance.
+        We should be able to ping the instances.
 
         And we should be able to reach the Internet.
 
+        The instances are pinged concurrently.
+
         :param :class:`TestHost` test_host: The host to run the test from.
-        :param str instance_name: The name of the Nova instance to connect to.
+        :param str instance_names: The names of the Nova instances to connect
+                                   to.
         """
         logger.debug("Testing ping ...")
-        ip = None
         servers = test_host.check_output([
             '/snap/bin/microstack.openstack',
             'server', 'list', '--format', 'json'
         ])
         servers = json.loads(servers)
-        for server in servers:
-            if server['Name'] == instance_name:
-                ip = server['Networks'].split(",")[1].strip()
-                break
-
-        self.assertTrue(ip)
-
-        test_host.call(['ping', '-i1', '-c10', '-w11', ip])
+        ips = []
+        for instance_name in instance_names:
+            ip = None
+            for server in servers:
+                if server['Name'] == instance_name:
+                    ip = server['Networks'].split(",")[1].strip()
+                    break
+
+            self.assertTrue(ip)
+            ips.append(ip)
+
+        with ThreadPoolExecutor(max_workers=len(ips)) as executor:
+            futures = [
+                executor.submit(test_host.call,
+                                ['ping', '-i1', '-c10', '-w11', ip])
+                for ip in ips
+            ]
+            for future in futures:
+                future.result()
 
     @gui_wrapper
     def verify_gui(self, test_host):
         """Verify Horizon Dashboard operation by logging in."""
-        control_ip = test_host.check_output([
-            'sudo', 'snap', 'get', 'microstack', 'config.network.control-ip',
-        ]).decode('utf-8')
+        # Fetch all of the required settings with a single snapd request.
+        config = json.loads(test_host.check_output([
+            'sudo', 'snap', 'get', '-d', 'microstack', 'config',
+        ]))['config']
+        control_ip = config['network']['control-ip']
         logger.debug('Verifying GUI for (IP: {})'.format(control_ip))
-        dashboard_port = test_host.check_output([
-            'sudo', 'snap', 'get',
-            'microstack',
-            'config.network.ports.dashboard']).decode('utf-8')
-        keystone_password = test_host.check_output([
-            'sudo', 'snap', 'get',
-            'microstack',
-            'config.credentials.keystone-password'
-        ]).decode('utf-8')
+        dashboard_port = config['network']['ports']['dashboard']
+        keystone_password = config['credentials']['keystone-password']
         self.driver.get(f'http://{control_ip}:{dashboard_port}/')
+        wait = WebDriverWait(self.driver, 30)
         # Login to horizon!
-        self.driver.find_element(By.ID, "id_username").click()
-        self.driver.find_element(By.ID, "id_username").send_keys("admin")
+        username = wait.until(
+            expected_conditions.element_to_be_clickable(
+                (By.ID, "id_username")))
+        username.click()
+        username.send_keys("admin")
         self.driver.find_element(By.ID, "id_password").send_keys(
             keystone_password)
         self.driver.find_element(By.CSS_SELECTOR, "#loginBtn > span").click()
         # Verify that we can click something on the dashboard -- e.g.,
         # we're still not sitting at the login screen.
-        self.driver.find_element(By.LINK_TEXT, "Images").click()
+        wait.until(
+            expected_conditions.element_to_be_clickable(
+                (By.LINK_TEXT, "Images"))).click()
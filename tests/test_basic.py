@@ -41,11 +41,9 @@ class TestBasics(Framework):
             ])
         endpoints = self._localhost.check_output(
             ['/snap/bin/microstack.openstack', 'endpoint', 'list']
-        ).decode('utf-8')
+        )
 
-        control_ip = self._localhost.check_output(
-            ['sudo', 'snap', 'get', 'microstack', 'config.network.control-ip'],
-        ).decode('utf-8')
+        control_ip = self._localhost.control_ip
 
         # Endpoints should contain the control IP.
         self.assertTrue(control_ip in endpoints)
@@ -69,9 +67,7 @@ class TestBasics(Framework):
         # ovs bridge goes away.
 
         # Check to verify that our bridge is there.
-        self.assertTrue(
-            'br-ex' in self._localhost.check_output(
-                ['ip', 'a']).decode('utf-8'))
+        self.assertTrue(self._has_iface(self._localhost, 'br-ex'))
 
         self._localhost.setup_tempest_verifier()
         # Make sure there are no verification failures in the report.
@@ -91,9 +87,7 @@ class TestBasics(Framework):
             ['snap', 'list', 'microstack']), 1)
 
         # Verify that bridge is gone.
-        self.assertFalse(
-            'br-ex' in self._localhost.check_output(
-                ['ip', 'a']).decode('utf-8'))
+        self.assertFalse(self._has_iface(self._localhost, 'br-ex'))
 
         # We made it to the end. Set passed to True!
         self.passed = True
@@ -18,9 +18,11 @@ import netifaces
 import tenacity
 import logging
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 sys.path.append(os.getcwd())
 
-from tests.framework import Framework  # noqa E402
+from tests.framework import Framework, gather  # noqa E402
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -36,7 +38,6 @@ class TestCluster(Framework):
     def test_cluster(self):
         openstack_cmd = '/snap/bin/microstack.openstack'
         control_host = self._localhost
-        control_host.install_microstack(path='microstack_ussuri_amd64.snap')
 
         # Get an IP address on the lxdbr0 bridge and use it for the
         # control IP so that the tunnel ports of the compute node target the
@@ -48,33 +49,46 @@ class TestCluster(Framework):
         self.assertEqual(len(ifaddrs), 1)
         control_ip = ifaddrs[0]['addr']
 
-        control_host.init_microstack(['--auto', '--control',
-                                      f'--default-source-ip={control_ip}'])
-
-        compute_host = self.add_lxd_host('focal')
-        compute_host.copy_to('microstack_ussuri_amd64.snap', '/root/')
-
-        # snapd does not come up immediately in the container.
-        @tenacity.retry(wait=tenacity.wait_fixed(1),
-                        stop=tenacity.stop_after_attempt(10))
-        def wait_snapd():
-            compute_host.check_call(['sudo', 'snap', 'list'])
-
-        wait_snapd()
-
-        # wait for an IPv4 address to appear on the container interface
-        @tenacity.retry(wait=tenacity.wait_fixed(1),
-                        stop=tenacity.stop_after_attempt(10))
-        def wait_addr():
-            logger.debug('Checking for an eth0 interface addresses presence'
-                         ' in the container.')
-            cmd = ['ip', '-4', '-o', 'addr', 'show', 'eth0']
-            ip_out = compute_host.check_output(cmd).decode('utf-8')
-            logger.debug(f'{" ".join(cmd)} output:\n{ip_out}')
-
-        wait_addr()
-
-        compute_host.install_microstack(path='microstack_ussuri_amd64.snap')
+        def setup_control_host():
+            control_host.install_microstack(
+                path='microstack_ussuri_amd64.snap')
+            control_host.init_microstack([
+                '--auto', '--control', f'--default-source-ip={control_ip}'])
+
+        def setup_compute_host():
+            compute_host = self.add_lxd_host('focal')
+            compute_host.copy_to('microstack_ussuri_amd64.snap', '/root/')
+
+            # snapd does not come up immediately in the container: block
+            # until it has finished seeding instead of polling it. Only
+            # retry if snapd is not yet reachable at all.
+            @tenacity.retry(wait=tenacity.wait_exponential(multiplier=0.1,
+                                                           min=0.05, max=2),
+                            stop=(tenacity.stop_after_attempt(10) |
+                                  tenacity.stop_after_delay(30)))
+            def wait_snapd():
+                compute_host.check_call(
+                    ['sudo', 'snap', 'wait', 'system', 'seed.loaded'])
+
+            wait_snapd()
+
+            # The container is known to have an IPv4 address at this point
+            # since LXDTestHost waits for it during the launch.
+
+            compute_host.install_microstack(
+                path='microstack_ussuri_amd64.snap')
+            return compute_host
+
+        # The control node initialization and the compute node boot are
+        # independent of each other until the join step so run them
+        # concurrently.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            control_future = executor.submit(setup_control_host)
+            compute_future = executor.submit(setup_compute_host)
+            for future in as_completed([control_future, compute_future]):
+                # Re-raise any exception that occurred in a worker.
+                future.result()
+        compute_host = compute_future.result()
 
         # TODO add the following to args for init
         compute_host.check_call([
@@ -83,7 +97,7 @@ class TestCluster(Framework):
 
         connection_string = control_host.check_output([
             'sudo', 'microstack', 'add-compute'
-        ]).decode('utf-8')
+        ])
         self.assertTrue(connection_string)
 
         compute_host.check_call([
@@ -91,17 +105,19 @@ class TestCluster(Framework):
             '--compute', '--join', connection_string, '--debug'
         ])
 
-        # Verify that our services look setup properly on compute node.
-        services = compute_host.check_output([
-            'systemctl', 'status', 'snap.microstack.*',
-            '--no-page']).decode('utf-8')
+        # The following queries are independent so run them concurrently.
+        services, compute_fqdn, compute_ip = gather([
+            compute_host.popen(['systemctl', 'status', 'snap.microstack.*',
+                                '--no-page']),
+            compute_host.popen(['hostname', '-f']),
+            compute_host.popen(['sudo', 'snap', 'get', 'microstack',
+                                'config.network.compute-ip']),
+        ])
 
+        # Verify that our services look setup properly on compute node.
         self.assertTrue('nova-compute' in services)
         self.assertFalse('keystone-' in services)
 
-        compute_fqdn = compute_host.check_output([
-            'hostname', '-f']).decode('utf-8')
-
         instance_name = 'test-instance'
         # Launch from the control host but schedule to the compute host.
         control_host.check_call([
@@ -110,11 +126,6 @@ class TestCluster(Framework):
             '--availability-zone', f'nova:{compute_fqdn}'])
 
         # Verify endpoints
-        compute_ip = compute_host.check_output([
-            'sudo', 'snap',
-            'get', 'microstack',
-            'config.network.compute-ip'
-        ]).decode('utf-8')
         self.assertFalse(compute_ip == control_ip)
 
         # Ping the instance
@@ -122,7 +133,7 @@ class TestCluster(Framework):
         servers = compute_host.check_output([
             openstack_cmd,
             'server', 'list', '--format', 'json'
-        ]).decode('utf-8')
+        ])
         servers = json.loads(servers)
         for server in servers:
             if server['Name'] == instance_name:
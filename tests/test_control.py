@@ -13,7 +13,7 @@ import unittest
 
 sys.path.append(os.getcwd())
 
-from tests.framework import Framework, check, check_output  # noqa E402
+from tests.framework import Framework  # noqa E402
 
 
 class TestControlNode(Framework):
@@ -24,14 +24,14 @@ class TestControlNode(Framework):
 
         """
 
-        host = self.get_host()
-        host.install()
-        host.init(['--control'])
+        host = self._localhost
+        host.install_microstack(path='microstack_ussuri_amd64.snap')
+        host.init_microstack(['--auto', '--control'])
 
         print("Checking output of services ...")
-        services = check_output(
-            *host.prefix, 'systemctl', 'status', 'snap.microstack.*',
-            '--no-page')
+        services = host.check_output([
+            'systemctl', 'status', 'snap.microstack.*',
+            '--no-page'])
 
         print("services: @@@")
         print(services)
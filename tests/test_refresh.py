@@ -12,7 +12,7 @@ import unittest
 
 sys.path.append(os.getcwd())
 
-from tests.framework import Framework, check, check_output, call  # noqa E402
+from tests.framework import Framework  # noqa E402
 
 
 class TestRefresh(Framework):
@@ -33,39 +33,39 @@ class TestRefresh(Framework):
 
         """
         print("Installing and verfying {} ...".format(refresh_from))
-        host = self.get_host()
-        host.install(snap="microstack", channel=refresh_from)
-        host.init()
-        prefix = host.prefix
+        host = self._localhost
+        # The local host is shared by the tests in this class: start each
+        # refresh from a clean slate.
+        self.addCleanup(host.destroy)
+        host.install_microstack(channel=refresh_from)
+        host.init_microstack(['--auto', '--control'])
 
-        check(*prefix, '/snap/bin/microstack.launch', 'cirros',
-              '--name', 'breakfast', '--retry')
+        host.check_call(['/snap/bin/microstack.launch', 'cirros',
+                         '--name', 'breakfast', '--retry'])
 
-        if 'multipass' in prefix:
-            self.verify_instance_networking(host, 'breakfast')
+        self.verify_instance_networking(host, 'breakfast')
 
         print("Upgrading ...")
-        host.install()  # Install compiled snap
+        # Install compiled snap
+        host.install_microstack(path='microstack_ussuri_amd64.snap')
         # Should not need to re-init
 
         print("Verifying that refresh completed successfully ...")
 
         # Check our existing instance, starting it if necessary.
-        if json.loads(check_output(*prefix, '/snap/bin/microstack.openstack',
-                                   'server', 'show', 'breakfast',
-                                   '--format', 'json'))['status'] == 'SHUTOFF':
+        if json.loads(host.check_output([
+                '/snap/bin/microstack.openstack', 'server', 'show',
+                'breakfast', '--format', 'json']))['status'] == 'SHUTOFF':
             print("Starting breakfast (TODO: auto start.)")
-            check(*prefix, '/snap/bin/microstack.openstack', 'server', 'start',
-                  'breakfast')
+            host.check_call(['/snap/bin/microstack.openstack', 'server',
+                             'start', 'breakfast'])
 
         # Launch another instance
-        check(*prefix, '/snap/bin/microstack.launch', 'cirros',
-              '--name', 'lunch', '--retry')
+        host.check_call(['/snap/bin/microstack.launch', 'cirros',
+                         '--name', 'lunch', '--retry'])
 
         # Verify networking
-        if 'multipass' in prefix:
-            self.verify_instance_networking(host, 'breakfast')
-            self.verify_instance_networking(host, 'lunch')
+        self.verify_instance_networking(host, 'breakfast', 'lunch')
 
         # Verify GUI
         self.verify_gui(host)
@@ -9,22 +9,39 @@ from datetime import datetime
 from datetime import timezone
 from dateutil.relativedelta import relativedelta
 
-from oslo_serialization import (
-    base64,
-    msgpackutils
-)
+import msgspec
 
-from cluster.shell import config_get
+# Use SIMD-accelerated base64 routines where available.
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
 
-from keystoneauth1.identity import v3
-from keystoneauth1 import session
-from keystoneclient.v3 import client
+from cluster.shell import config_get
 
 
 VALIDITY_PERIOD = relativedelta(minutes=20)
 
 
+class JoinToken(msgspec.Struct):
+    """Data serialized into a connection string.
+
+    Encoded as a MessagePack map so that the result is identical to
+    the format previously produced by oslo.serialization's msgpackutils.
+    """
+    hostname: str
+    fingerprint: bytes
+    id: str
+    secret: str
+
+
 def _create_credential():
+    # Keystone libraries are slow to import so only load them when a
+    # credential actually needs to be created.
+    from keystoneauth1.identity import v3
+    from keystoneauth1 import session
+    from keystoneclient.v3 import client
+
     project_name = 'service'
     domain_name = 'default'
     # TODO: add support for TLS-terminated Keystone once this is supported.
@@ -66,8 +83,9 @@ def _create_credential():
         # Do not allow this app credential to create new app credentials.
         unrestricted=False,
         roles=[reader_role.id],
-        # Make the secret shorter than the default but secure enough.
-        secret=secrets.token_urlsafe(32)[:32]
+        # Make the secret shorter than the default but secure enough:
+        # 24 bytes -> 32 base64url chars, ~192 bits of entropy.
+        secret=secrets.token_urlsafe(24)
     )
 
 
@@ -91,18 +109,19 @@ def add_compute():
         raise Exception('Running add-compute is only supported on a'
                         ' control node.')
     app_cred = _create_credential()
-    data = {
+    token = JoinToken(
         # TODO: we do not use hostname verification, however, using
         # an FQDN might be useful here since the host may be behind NAT
         # with a split-horizon DNS implemented where a hostname would point
         # us to a different IP.
-        'hostname': config_get('config.network.control-ip'),
+        hostname=config_get('config.network.control-ip'),
         # Store bytes since the representation will be shorter than with hex.
-        'fingerprint': bytes.fromhex(config_get('config.cluster.fingerprint')),
-        'id': app_cred.id,
-        'secret': app_cred.secret,
-    }
-    connection_string = base64.encode_as_text(msgpackutils.dumps(data))
+        fingerprint=bytes.fromhex(config_get('config.cluster.fingerprint')),
+        id=app_cred.id,
+        secret=app_cred.secret,
+    )
+    connection_string = base64.b64encode(
+        msgspec.msgpack.encode(token)).decode('ascii')
 
     # Print the connection string and an expiration notice to the user.
     print('Use the following connection string to add a new compute node'
@@ -88,15 +88,13 @@ def join():
 
     # Load the response assuming it has the correct format. API versioning
     # should rule out inconsistencies, otherwise we will get an error here.
-    response_dict = json.loads(response_data)
-    credentials = response_dict['config']['credentials']
-    control_creds = {f'config.credentials.{k}': v
-                     for k, v in credentials.items()}
-    shell.config_set(**control_creds)
+    config = json.loads(response_data)['config']
+    updates = {'config.credentials.' + k: v
+               for k, v in config['credentials'].items()}
     # TODO: use the hostname from the connection string instead to
     # resolve an IP address (requires a valid DNS setup).
-    control_ip = response_dict['config']['network']['control-ip']
-    shell.config_set(**{'config.network.control-ip': control_ip})
+    updates['config.network.control-ip'] = config['network']['control-ip']
+    shell.config_set(**updates)
 
 
 if __name__ == '__main__':
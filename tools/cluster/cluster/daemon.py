@@ -1,19 +1,17 @@
+import hashlib
 import logging
-import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
 
-import semantic_version
+import msgspec
+import urllib3
 
-import keystoneclient.exceptions as kc_exceptions
+from flask import Flask, Response, request
 
-from flask import Flask, request, jsonify
-from werkzeug.exceptions import BadRequest
 
-
-from cluster.shell import check_output
-
-from keystoneauth1.identity import v3
-from keystoneauth1 import session
-from keystoneclient.v3 import client as v3client
+from cluster.shell import config_get
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +19,114 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 
 
-API_VERSION = semantic_version.Version('1.0.0')
+def _json_response(obj, status=200):
+    return Response(msgspec.json.encode(obj), status=status,
+                    mimetype='application/json')
+
+
+API_VERSION = '1.0.0'
+API_MAJOR_VERSION = 1
+
+# Semantic version (https://semver.org/): only the major component is
+# used so avoid building full version objects per request.
+_SEMVER_RE = re.compile(
+    r'^(0|[1-9][0-9]*)\.(?:0|[1-9][0-9]*)\.(?:0|[1-9][0-9]*)'
+    r'(?:-[0-9A-Za-z.-]+)?(?:\+[0-9A-Za-z.-]+)?$')
+
+# TODO: handle https here when TLS termination support is added.
+KEYSTONE_HOST = 'localhost'
+KEYSTONE_PORT = 5000
+
+# The number of request threads in each uWSGI worker process, see
+# cluster-api.ini.j2. Concurrent joins probe Keystone in parallel.
+WORKER_THREADS = 8
+
+# Keystone is only probed to issue tokens for application credentials
+# so a plain keep-alive connection pool is used instead of building
+# a keystoneclient session per request. The pool is thread-safe and
+# keeps a connection per worker thread.
+_keystone_pool = urllib3.HTTPConnectionPool(
+    KEYSTONE_HOST, KEYSTONE_PORT, maxsize=WORKER_THREADS, block=False,
+    timeout=urllib3.Timeout(connect=5, read=30))
+
+# Application credentials that have recently passed authorization against
+# Keystone, keyed by (credential id, secret digest) and mapped to a
+# monotonic deadline until which they are not re-validated. The deadline
+# is _AUTH_CACHE_TTL seconds away at most and never past the expiry of the
+# token Keystone issued. Once the cache holds _AUTH_CACHE_MAX_SIZE entries
+# expired ones are pruned, then the oldest ones are evicted.
+_AUTH_CACHE = {}
+_AUTH_CACHE_LOCK = threading.Lock()
+_AUTH_CACHE_TTL = 60
+_AUTH_CACHE_MAX_SIZE = 128
+
+
+def _auth_cache_key(credential_id, credential_secret):
+    return (credential_id,
+            hashlib.sha256(credential_secret.encode('utf-8')).digest())
+
+
+def _auth_cached(key):
+    """Check whether a credential has been authorized recently."""
+    with _AUTH_CACHE_LOCK:
+        return time.monotonic() < _AUTH_CACHE.get(key, 0)
+
+
+def _token_lifetime(body):
+    """Get the number of seconds until a Keystone token expires.
+
+    :param body: the body of a /v3/auth/tokens response.
+    :return: the lifetime in seconds or 0 if it cannot be determined.
+    """
+    try:
+        expires_at = msgspec.json.decode(body)['token']['expires_at']
+        # Python < 3.11 does not parse the 'Z' suffix used by Keystone.
+        expires = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
+    except (msgspec.DecodeError, KeyError, TypeError, AttributeError,
+            ValueError):
+        return 0
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return expires.timestamp() - time.time()
+
+
+def _auth_cache_store(key, lifetime):
+    """Remember a credential that has just passed authorization.
+
+    :param lifetime: the number of seconds until the token issued for
+                     the credential expires.
+    """
+    now = time.monotonic()
+    ttl = min(_AUTH_CACHE_TTL, lifetime)
+    if ttl <= 0:
+        return
+    with _AUTH_CACHE_LOCK:
+        # Re-insert the key so that it counts as the newest entry.
+        _AUTH_CACHE.pop(key, None)
+        if len(_AUTH_CACHE) >= _AUTH_CACHE_MAX_SIZE:
+            # Prune expired entries.
+            for k, deadline in list(_AUTH_CACHE.items()):
+                if deadline <= now:
+                    del _AUTH_CACHE[k]
+        while len(_AUTH_CACHE) >= _AUTH_CACHE_MAX_SIZE:
+            # Evict the oldest entries, dicts keep the insertion order.
+            del _AUTH_CACHE[next(iter(_AUTH_CACHE))]
+        _AUTH_CACHE[key] = now + ttl
+
+
+def _app_credential_auth(credential_id, credential_secret):
+    """Build a Keystone v3 application credential auth request body."""
+    return {
+        'auth': {
+            'identity': {
+                'methods': ['application_credential'],
+                'application_credential': {
+                    'id': credential_id,
+                    'secret': credential_secret,
+                },
+            },
+        },
+    }
 
 
 class Unauthorized(Exception):
@@ -95,65 +200,21 @@ class UnexpectedError(APIException):
 
 
 def _handle_api_version_exception(error):
-    response = jsonify(error.to_dict())
-    response.status_code = error.status_code
-    return response
-
-
-@app.errorhandler(APIVersionMissing)
-def handle_api_version_missing(error):
-    return _handle_api_version_exception(error)
-
-
-@app.errorhandler(APIVersionInvalid)
-def handle_api_version_invalid(error):
-    return _handle_api_version_exception(error)
-
-
-@app.errorhandler(APIVersionDropped)
-def handle_api_version_dropped(error):
-    return _handle_api_version_exception(error)
-
-
-@app.errorhandler(APIVersionNotImplemented)
-def handle_api_version_not_implemented(error):
-    return _handle_api_version_exception(error)
-
-
-@app.errorhandler(IncorrectContentType)
-def handle_incorrect_content_type(error):
-    return _handle_api_version_exception(error)
-
-
-@app.errorhandler(InvalidJSONInRequest)
-def handle_invalid_json_in_request(error):
-    return _handle_api_version_exception(error)
-
-
-@app.errorhandler(InvalidAuthDataInRequest)
-def handle_invalid_auth_data_format_in_request(error):
-    return _handle_api_version_exception(error)
-
-
-@app.errorhandler(InvalidAuthDataFormatInRequest)
-def handle_invalid_auth_data_in_request(error):
-    return _handle_api_version_exception(error)
+    return _json_response(error.to_dict(), status=error.status_code)
 
 
-@app.errorhandler(AuthorizationFailed)
-def handle_authorization_failed(error):
-    return _handle_api_version_exception(error)
-
-
-@app.errorhandler(UnexpectedError)
-def handle_unexpected_error(error):
-    return _handle_api_version_exception(error)
+for _exc in (APIVersionMissing, APIVersionInvalid, APIVersionDropped,
+             APIVersionNotImplemented, IncorrectContentType,
+             InvalidJSONInRequest, InvalidAuthDataInRequest,
+             InvalidAuthDataFormatInRequest, AuthorizationFailed,
+             UnexpectedError):
+    app.register_error_handler(_exc, _handle_api_version_exception)
 
 
 def join_info():
     """Generate the configuration information to return to a client."""
     # TODO: be selective about what we return. For now, we just get everything.
-    config = json.loads(check_output('snapctl', 'get', 'config'))
+    config = config_get('config')
     info = {'config': config}
     return info
 
@@ -169,37 +230,37 @@ def join():
         logger.debug('The client has not specified the API-version header.')
         raise APIVersionMissing()
     else:
-        try:
-            api_version = semantic_version.Version(request_version)
-        except ValueError:
+        match = _SEMVER_RE.match(request_version)
+        if match is None:
             logger.debug('The client has specified an invalid API version.'
                          f': {request_version}')
             raise APIVersionInvalid()
+        api_major_version = int(match.group(1))
 
     # Compare the API version used by the clustering service with the
     # one specified in the request and return an appropriate response.
-    if api_version.major > API_VERSION.major:
+    if api_major_version > API_MAJOR_VERSION:
         logger.debug('The client requested a version that is not'
-                     f' supported yet: {api_version}.')
+                     f' supported yet: {request_version}.')
         raise APIVersionNotImplemented()
-    elif api_version.major < API_VERSION.major:
+    elif api_major_version < API_MAJOR_VERSION:
         logger.debug('The client request version is no longer supported'
-                     f': {api_version}.')
+                     f': {request_version}.')
         raise APIVersionDropped()
     else:
-        # Flask raises a BadRequest if the JSON content is invalid and
-        # returns None if the Content-Type header is missing or not set
-        # to application/json.
+        if not request.is_json:
+            logger.debug('The client has not specified the application/json'
+                         ' content type in the request.')
+            raise IncorrectContentType()
+        # The body is decoded with msgspec rather than by Flask.
         try:
-            req_json = request.json
-        except BadRequest:
+            req_json = msgspec.json.decode(request.get_data())
+        except msgspec.DecodeError:
+            req_json = None
+        if not isinstance(req_json, dict):
             logger.debug('The client has POSTed an invalid JSON'
                          ' in the request.')
             raise InvalidJSONInRequest()
-        if req_json is None:
-            logger.debug('The client has not specified the application/json'
-                         ' content type in the request.')
-            raise IncorrectContentType()
 
         # So far we don't have any minor versions with backwards-compatible
         # changes so just assume that all data will be present or error out.
@@ -210,71 +271,49 @@ def join():
                          ' authentication data in the request.')
             return MissingAuthDataInRequest()
 
-        # TODO: handle https here when TLS termination support is added.
-        keystone_base_url = 'http://localhost:5000/v3'
+        if not (isinstance(credential_id, str) and
+                isinstance(credential_secret, str)):
+            logger.debug('The client has specified authentication data'
+                         ' of an unexpected type in the request.')
+            raise InvalidAuthDataFormatInRequest()
 
-        # In an unlikely event of failing to construct an auth object
-        # treat it as if invalid data got passed in terms of responding
-        # to the client.
-        try:
-            auth = v3.ApplicationCredential(
-                auth_url=keystone_base_url,
-                application_credential_id=credential_id,
-                application_credential_secret=credential_secret
-            )
-        except Exception:
-            logger.exception('An exception has occurred while trying to build'
-                             ' an auth object for an application credential'
-                             ' passed from the clustering client.')
-            raise InvalidAuthDataInRequest()
+        cache_key = _auth_cache_key(credential_id, credential_secret)
+        if _auth_cached(cache_key):
+            logger.debug('The application credential passed by the client'
+                         ' has been authorized recently.')
+            return _json_response(join_info())
 
         try:
-            # Use the auth object with the app credential to create a session
-            # which the Keystone client will use.
-            sess = session.Session(auth=auth)
-        except Exception:
-            logger.exception('An exception has occurred while trying to build'
-                             ' a Session object with auth data'
-                             ' passed from the clustering client.')
-            raise UnexpectedError()
-
-        try:
-            keystone_client = v3client.Client(session=sess)
-        except Exception:
-            logger.exception('An exception has occurred while trying to build'
-                             ' a Keystone Client object with auth data'
-                             ' passed from the clustering client.')
+            # The add-compute command creates application credentials with
+            # an expiration time. Keystone refuses to issue tokens for
+            # expired or unknown credentials in which case an error is
+            # returned to the client.
+            response = _keystone_pool.urlopen(
+                'POST', '/v3/auth/tokens', retries=0, preload_content=True,
+                headers={'Content-Type': 'application/json'},
+                body=msgspec.json.encode(
+                    _app_credential_auth(credential_id, credential_secret)))
+        except urllib3.exceptions.HTTPError:
+            logger.exception('Failed to connect to Keystone')
             raise UnexpectedError()
 
-        try:
-            # The add-compute command creates application credentials that
-            # allow access to /v3/auth/catalog with an expiration time.
-            # Authorization failures occur after an app credential expires
-            # in which case an error is returned to the client.
-            keystone_client.get(f'{keystone_base_url}/auth/catalog')
-        except (kc_exceptions.AuthorizationFailure,
-                kc_exceptions.Unauthorized):
-            logger.exception('Failed to get a Keystone token'
-                             ' with the application credentials'
-                             ' passed from the clustering client.')
+        if response.status == 401:
+            logger.debug('Failed to get a Keystone token'
+                         ' with the application credentials'
+                         ' passed from the clustering client.')
             raise AuthorizationFailed()
-        except ValueError:
-            logger.exception('Insufficient amount of parameters were'
-                             ' used in the request to Keystone.')
-            raise UnexpectedError()
-        except kc_exceptions.ConnectionError:
-            logger.exception('Failed to connect to Keystone')
-            raise UnexpectedError()
-        except kc_exceptions.SSLError:
-            logger.exception('A TLS-related error has occurred while'
-                             ' connecting to Keystone')
+        elif (response.status != 201 or
+                response.headers.get('X-Subject-Token') is None):
+            logger.error('Unexpected response from Keystone while issuing'
+                         f' a token: {response.status}')
             raise UnexpectedError()
 
         # We were able to authenticate against Keystone using the
         # application credential and verify that it has not expired
         # so the information for a compute node to join the cluster can
         # now be returned.
-        return json.dumps(join_info())
+        _auth_cache_store(cache_key, _token_lifetime(response.data))
+        return _json_response(join_info())
 
 
 @app.route('/')
@@ -284,4 +323,4 @@ def home():
         'info': 'MicroStack clustering daemon.'
 
     }
-    return json.dumps(status)
+    return _json_response(status)
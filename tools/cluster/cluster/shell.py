@@ -1,7 +1,18 @@
+import copy
 import os
 import pymysql
 import subprocess
-import json
+import threading
+import time
+
+import msgspec
+
+# The snap configuration document cached by config_get. Reads within
+# CONFIG_CACHE_TTL seconds are served from memory; config_set drops it
+# once the new values have been set.
+CONFIG_CACHE_TTL = 2
+_config_cache = {'data': None, 'expires': 0}
+_config_cache_lock = threading.Lock()
 
 
 def sql(cmd) -> None:
@@ -41,12 +52,56 @@ def check(*args):
     return subprocess.check_call(args, env=os.environ)
 
 
+def _snapctl_get(*args):
+    """Run snapctl get and decode the JSON it prints."""
+    return msgspec.json.decode(
+        subprocess.check_output(('snapctl', 'get') + args, env=os.environ))
+
+
+def _config_document():
+    """Get the whole snap configuration document, caching it briefly."""
+    with _config_cache_lock:
+        if (_config_cache['data'] is None or
+                time.monotonic() >= _config_cache['expires']):
+            _config_cache['data'] = _snapctl_get('-d', 'config')
+            _config_cache['expires'] = time.monotonic() + CONFIG_CACHE_TTL
+        return _config_cache['data']
+
+
+def _lookup(document, key):
+    """Look up a dotted key in a configuration document.
+
+    :raises KeyError: if the key is not present in the document.
+    """
+    value = document
+    for part in key.split('.'):
+        if not isinstance(value, dict):
+            raise KeyError(key)
+        value = value[part]
+    return copy.deepcopy(value)
+
+
 def config_get(*keys):
     """Get snap config keys via snapctl.
 
+    Keys under the config namespace are served from a cached copy of the
+    configuration document.
+
     :param keys list[str]: Keys to retrieve from the snap configuration.
     """
-    return json.loads(check_output('snapctl', 'get', '-t', *keys))
+    if all(key == 'config' or key.startswith('config.') for key in keys):
+        document = _config_document()
+        try:
+            values = {key: _lookup(document, key) for key in keys}
+        except KeyError:
+            # Let snapctl report unknown keys as it did before.
+            pass
+        else:
+            # Mimic snapctl which only returns a mapping for multiple keys.
+            if len(keys) == 1:
+                return values[keys[0]]
+            return values
+    return _snapctl_get('-t', *keys)
 
 
 def config_set(**kwargs):
@@ -54,4 +109,12 @@ def config_set(**kwargs):
 
     :param kwargs dict[str, str]: Values to set in the snap configuration.
     """
-    check_output('snapctl', 'set', *[f'{k}={v}' for k, v in kwargs.items()])
+    try:
+        check_output('snapctl', 'set',
+                     *[f'{k}={v}' for k, v in kwargs.items()])
+    finally:
+        # Drop the cached document only once snapctl has returned: a read
+        # by another thread while the values are being set would cache
+        # the old ones again.
+        with _config_cache_lock:
+            _config_cache['data'] = None
@@ -1,18 +1,76 @@
 #!/usr/bin/env python3
 
+import hashlib
+import os
+import ssl
+import subprocess
+import tempfile
 from pathlib import Path
 
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from init import shell
 
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography import x509
-from cryptography.x509.oid import NameOID
+# Validity period of the generated certificate (10 years).
+CERT_VALIDITY_DAYS = 3653
+# Certificates expiring sooner than that are generated again.
+CERT_RENEWAL_DAYS = 30
+
+_PEM_CERT_HEADER = b'-----BEGIN CERTIFICATE-----'
+
+
+def _atomic_write(path: Path, data: bytes, mode: int):
+    """Replace a file atomically and make sure it reaches the disk.
+
+    The data is written to a temporary file in the same directory, which
+    is created readable by its owner only and given the requested mode
+    before any data is written to it. The file is then synced and renamed
+    over the target, replacing a symlink rather than following it, and the
+    directory is synced so that the rename persists. A crash leaves either
+    the old or the new file in place, never a truncated one.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent),
+                                    prefix=f'.{path.name}.')
+    try:
+        try:
+            os.fchmod(fd, mode)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, str(path))
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    dir_fd = os.open(str(path.parent), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _tls_paths():
+    return (
+        Path(shell.config_get('config.cluster.tls-cert-path')),
+        Path(shell.config_get('config.cluster.tls-key-path')),
+    )
 
-from init import shell
+
+def has_valid_cert():
+    """Check whether a certificate and key usable for clustering exist.
+
+    The certificate must not expire within CERT_RENEWAL_DAYS so that
+    there is enough time left to join nodes using it.
+    """
+    cert_path, key_path = _tls_paths()
+    if not (cert_path.exists() and key_path.exists()):
+        return False
+    return shell.call('openssl', 'x509', '-noout', '-in', str(cert_path),
+                      '-checkend', str(CERT_RENEWAL_DAYS * 24 * 60 * 60),
+                      quiet=True)
 
 
 def generate_selfsigned():
@@ -27,49 +85,35 @@ def generate_selfsigned():
     node and its fingerprint is copied in a token to another node
     via a secure channel.
     https://owasp.org/www-community/controls/Certificate_and_Public_Key_Pinning
+
+    An existing certificate and key are replaced, use has_valid_cert to
+    check whether that is necessary.
     """
-    cert_path, key_path = (
-        Path(shell.config_get('config.cluster.tls-cert-path')),
-        Path(shell.config_get('config.cluster.tls-key-path')),
-    )
-    # Do not generate a new certificate and key if there is already an existing
-    # pair. TODO: improve this check and allow renewal.
-    if cert_path.exists() and key_path.exists():
-        return
+    cert_path, key_path = _tls_paths()
 
+    # Delegate key and certificate generation to the openssl CLI which is
+    # considerably faster than going through the Python bindings. The CA
+    # basic constraint comes from the v3_ca section of the default config:
+    # passing it via -addext as well fails on OpenSSL 1.1.1. Both PEM
+    # documents are written to stdout (the key first) so that the files
+    # are created here with the right permissions.
     dummy_cn = 'microstack.run'
-    key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-        backend=default_backend(),
-    )
-    common_name = x509.Name([
-        x509.NameAttribute(NameOID.COMMON_NAME, dummy_cn)
-    ])
-    san = x509.SubjectAlternativeName([x509.DNSName(dummy_cn)])
-    basic_contraints = x509.BasicConstraints(ca=True, path_length=0)
-    now = datetime.utcnow()
-    cert = (
-        x509.CertificateBuilder()
-        .subject_name(common_name)
-        .issuer_name(common_name)
-        .public_key(key.public_key())
-        .serial_number(x509.random_serial_number())
-        .not_valid_before(now)
-        .not_valid_after(now + relativedelta(years=10))
-        .add_extension(basic_contraints, False)
-        .add_extension(san, False)
-        .sign(key, hashes.SHA256(), default_backend())
-    )
+    proc = subprocess.run(
+        ['openssl', 'req', '-x509', '-nodes', '-sha256',
+         '-newkey', 'rsa:2048',
+         '-keyout', '/dev/stdout', '-out', '/dev/stdout',
+         '-days', str(CERT_VALIDITY_DAYS),
+         '-subj', f'/CN={dummy_cn}',
+         '-addext', f'subjectAltName=DNS:{dummy_cn}'],
+        env=shell._env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    proc.check_returncode()
+    cert_start = proc.stdout.index(_PEM_CERT_HEADER)
+    _atomic_write(key_path, proc.stdout[:cert_start], 0o600)
+    _atomic_write(cert_path, proc.stdout[cert_start:], 0o644)
 
-    cert_fprint = cert.fingerprint(hashes.SHA256()).hex()
+    # The fingerprint is the SHA-256 digest of the DER-encoded certificate,
+    # stored as hex; add-compute converts it to bytes for the token.
+    cert_der = ssl.PEM_cert_to_DER_cert(
+        proc.stdout[cert_start:].decode('ascii'))
+    cert_fprint = hashlib.sha256(cert_der).hexdigest()
     shell.config_set(**{'config.cluster.fingerprint': cert_fprint})
-
-    serialized_cert = cert.public_bytes(encoding=serialization.Encoding.PEM)
-    serialized_key = key.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.PKCS8,
-        encryption_algorithm=serialization.NoEncryption(),
-    )
-    cert_path.write_bytes(serialized_cert)
-    key_path.write_bytes(serialized_key)
@@ -49,3 +49,35 @@ class Env():
     def get_env(self):
         """Get a mapping friendly dict."""
         return self.__dict__
+
+
+# Modification time of microstack.rc when it was last loaded. It is not
+# kept in the environment itself since that is passed to subprocesses.
+_rc_mtime = None
+
+
+def reload_env(force=False):
+    """Load the variables exported by microstack.rc into the environment.
+
+    The file is only parsed if it has been modified since the last time
+    it was loaded unless force is set.
+
+    :param force: parse the file even if it has not been modified.
+    :return: the updated environment dict.
+    """
+    global _rc_mtime
+
+    env = Env().get_env()
+    mstackrc = '{SNAP_COMMON}/etc/microstack.rc'.format(**env)
+    mtime = os.path.getmtime(mstackrc)
+    if mtime == _rc_mtime and not force:
+        return env
+
+    with open(mstackrc, 'r') as rc_file:
+        for line in rc_file:
+            if not line.startswith('export '):
+                continue
+            key, _, val = line[7:].partition('=')
+            env[key.strip()] = val.strip()
+    _rc_mtime = mtime
+    return env
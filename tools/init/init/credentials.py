@@ -1,9 +1,21 @@
+import os
 import string
-import secrets
 
 DEFAULT_PASSWORD_LENGTH = 32
 
+_ALPHABET = (string.ascii_letters + string.digits).encode('ascii')
+# Random bytes at or above this value are rejected so that every symbol
+# of the alphabet is equally likely to be picked.
+_REJECTION_THRESHOLD = 256 - 256 % len(_ALPHABET)
+
 
 def generate_password(length=DEFAULT_PASSWORD_LENGTH):
-    return ''.join(secrets.choice(
-        string.ascii_letters + string.digits) for i in range(length))
+    password = bytearray()
+    while len(password) < length:
+        # Draw entropy in bulk rather than once per character.
+        for b in os.urandom(length * 2):
+            if b < _REJECTION_THRESHOLD:
+                password.append(_ALPHABET[b % len(_ALPHABET)])
+                if len(password) == length:
+                    break
+    return password.decode('ascii')
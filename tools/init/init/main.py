@@ -40,8 +40,8 @@ from functools import wraps
 from init.config import log
 from init.shell import (
     default_network,
-    check,
     check_output,
+    config_prefetch,
     config_set,
     fallback_source_address,
 )
@@ -126,39 +126,41 @@ def process_init_args(args):
         raise ValueError('A role (--compute or --control) must be specified '
                          ' when using --auto')
 
+    if args.auto and not args.control and not args.connection_string:
+        raise ValueError('The connection string parameter must be specified'
+                         ' for compute nodes.')
+
+    if args.debug:
+        log.setLevel(logging.DEBUG)
+
+    # Collect all values so that they are written with one snapctl call.
+    config = {}
+
     if args.compute or args.control:
-        config_set(**{'config.is-clustered': 'true'})
+        config['config.is-clustered'] = 'true'
 
     if args.compute:
-        config_set(**{'config.cluster.role': 'compute'})
+        config['config.cluster.role'] = 'compute'
 
     if args.control:
         # If both compute and control are passed for some reason, we
         # wind up with the role of 'control', which is best, as a
         # control node also serves as a compute node in our hyper
         # converged architecture.
-        config_set(**{'config.cluster.role': 'control'})
+        config['config.cluster.role'] = 'control'
 
     if args.connection_string:
-        config_set(**{
-            'config.cluster.connection-string.raw': args.connection_string})
-
-    config_set(**{
-        'config.network.default-source-ip': args.default_source_ip})
+        config['config.cluster.connection-string.raw'] = (
+            args.connection_string)
 
-    if args.auto and not args.control and not args.connection_string:
-        raise ValueError('The connection string parameter must be specified'
-                         ' for compute nodes.')
-
-    if args.debug:
-        log.setLevel(logging.DEBUG)
-
-    config_set(**{
+    config.update({
+        'config.network.default-source-ip': args.default_source_ip,
         'config.cinder.setup-loop-based-cinder-lvm-backend':
         f'{str(args.setup_loop_based_cinder_lvm_backend).lower()}',
         'config.cinder.loop-device-file-size':
         f'{args.loop_device_file_size}G',
     })
+    config_set(**config)
 
     return args.auto
 
@@ -218,17 +220,27 @@ def init() -> None:
         # The same code-path as for other questions will be executed.
         question_list.insert(0, clustering_question)
 
+    # Read the whole configuration, including the current answers to all
+    # questions, at once instead of with a snapctl call per key.
+    config_prefetch('config')
+
     for question in question_list:
         if auto:
             # Force all questions to be non-interactive if we passed --auto.
             question.interactive = False
 
         try:
+            # Make sure that answers to preceding ConfigQuestions are
+            # written out before the next question starts using them.
+            if not isinstance(question, questions.ConfigQuestion):
+                questions.flush()
             question.ask()
         except questions.ConfigError as e:
             log.critical(e)
             sys.exit(1)
 
+    questions.flush()
+
 
 def set_network_info() -> None:
     """Find and use the  default network on a machine.
@@ -246,11 +258,12 @@ def set_network_info() -> None:
             'Falling back on 10.20.20.1')
         return
 
-    check('snapctl', 'set', 'config.network.ext-gateway={}'.format(gate))
-    check('snapctl', 'set', 'config.network.ext-cidr={}'.format(cidr))
-    check('snapctl', 'set', 'config.network.control-ip={}'.format(ip))
-    check('snapctl', 'set',
-          'config.network.node-fqdn={}'.format(socket.getfqdn()))
+    config_set(**{
+        'config.network.ext-gateway': gate,
+        'config.network.ext-cidr': cidr,
+        'config.network.control-ip': ip,
+        'config.network.node-fqdn': socket.getfqdn(),
+    })
 
 
 @requires_sudo
@@ -271,6 +284,10 @@ def remove() -> None:
         questions.uninstall.RemoveMicrostack(),
     ]
 
+    # Read the whole configuration, including the current answers to all
+    # questions, at once instead of with a snapctl call per key.
+    config_prefetch('config')
+
     for question in question_list:
         if auto:
             question.interactive = False
@@ -23,21 +23,231 @@ limitations under the License.
 
 """
 
-import json
-from time import sleep
+import importlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
 from os import path
 
 from init import shell
 from init.shell import (check, call, check_output, sql, nc_wait, log_wait,
-                        restart, download, disable, enable)
-from init.config import Env, log
-from init import cluster_tls
+                        http_wait, restart, download, disable, enable,
+                        json_loads)
+from init.config import Env, log, reload_env
 from init.questions.question import Question
-from init.questions import clustering, network, uninstall  # noqa F401
+from init.questions import network
 
 
 _env = Env().get_env()
 
+# Submodules which are only needed on some code paths. The clustering
+# questions pull in cryptography and oslo, so they are imported on first
+# access (PEP 562) rather than on every init run.
+_LAZY_SUBMODULES = ('clustering', 'uninstall')
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+# Services which are not needed on a node that doesn't run the respective
+# part of the control plane.
+_NOVA_CP_SERVICES = frozenset({
+    'nova-api',
+    'nova-conductor',
+    'nova-scheduler',
+    'nova-api-metadata',
+})
+_CINDER_SERVICES = frozenset({
+    'cinder-uwsgi',
+    'cinder-scheduler',
+    'cinder-volume',
+    'cinder-backup',
+})
+_NEUTRON_CP_SERVICES = frozenset({
+    'neutron-api',
+    'ovn-northd',
+    'ovn-ovsdb-server-sb',
+    'ovn-ovsdb-server-nb',
+})
+_NEUTRON_COMPUTE_SERVICES = (
+    'ovs-vswitchd',
+    'ovsdb-server',
+    'ovn-controller',
+    'neutron-ovn-metadata-agent',
+)
+
+
+class _Paths:
+    """Paths within the snap that are built from the environment once."""
+
+    @cached_property
+    def ovn_nb_socket(self):
+        return f'unix:{_env["SNAP_COMMON"]}/run/ovn/ovnnb_db.sock'
+
+    @cached_property
+    def ovn_sb_socket(self):
+        return f'unix:{_env["SNAP_COMMON"]}/run/ovn/ovnsb_db.sock'
+
+    @cached_property
+    def rabbitmq_startup_log(self):
+        return f'{_env["SNAP_COMMON"]}/log/rabbitmq/startup_log'
+
+    @cached_property
+    def mysql_error_log(self):
+        return f'{_env["SNAP_COMMON"]}/log/mysql/error.log'
+
+    @cached_property
+    def images_dir(self):
+        return f'{_env["SNAP_COMMON"]}/images'
+
+    @cached_property
+    def setup_rabbit(self):
+        return f'{_env["SNAP"]}/bin/setup-rabbit'
+
+
+_paths = _Paths()
+
+
+# The maximum number of OpenStack CLI commands to run concurrently.
+MAX_PARALLEL_COMMANDS = 8
+
+
+def _run_parallel(run, commands):
+    """Run independent commands concurrently.
+
+    :param run: the function used to run each command, e.g. check or call.
+    :param commands: an iterable of argument tuples for run.
+    :return: the results of run in the order of commands.
+    """
+    commands = list(commands)
+    if not commands:
+        return []
+    with ThreadPoolExecutor(
+            max_workers=min(len(commands), MAX_PARALLEL_COMMANDS)) as pool:
+        return list(pool.map(lambda args: run(*args), commands))
+
+
+def _call_parallel(*functions):
+    """Call independent setup steps concurrently.
+
+    :param functions: callables taking no arguments.
+    :return: their results in the order of functions.
+    """
+    return _run_parallel(lambda function: function(),
+                         [(function,) for function in functions])
+
+
+def _existing_endpoints():
+    """Get (service type, interface) pairs of all endpoints at once."""
+    identity = _openstack_connection().identity
+    service_types = {service.id: service.type
+                     for service in identity.services()}
+    return {
+        (service_types.get(endpoint.service_id), endpoint.interface)
+        for endpoint in identity.endpoints()
+    }
+
+
+def _create_endpoints(run, service, url, interfaces=('public', 'internal',
+                                                     'admin'),
+                      existing=frozenset()):
+    """Create endpoints of a service for several interfaces concurrently.
+
+    :param existing: (service type, interface) pairs to skip as returned by
+                     _existing_endpoints.
+    """
+    commands = [
+        ('openstack', 'endpoint', 'create', '--region', 'microstack',
+         service, interface, url)
+        for interface in interfaces
+        if (service, interface) not in existing
+    ]
+    _run_parallel(run, commands)
+    if commands:
+        # The service catalog is cached along with the token, so get a new
+        # connection for the new endpoints to be found.
+        _openstack_connection.cache_clear()
+
+
+@lru_cache(maxsize=1)
+def _lscpu_fields():
+    """Get CPU information from lscpu as a field -> data mapping."""
+    # Sample lscpu outputs: util-linux/tests/expected/lscpu/
+    cpu_info = json_loads(check_output('lscpu', '-J'))['lscpu']
+    return {entry['field']: entry['data'] for entry in cpu_info}
+
+
+@lru_cache(maxsize=1)
+def _openstack_connection():
+    """Get an OpenStack SDK connection authenticated as the admin user.
+
+    The connection (and its token) is shared by the callers so that they
+    don't pay for an 'openstack' CLI process and an authentication each.
+    """
+    # openstacksdk is provided by the python-openstackclient install of the
+    # openstack-projects part and is slow to import.
+    import openstack
+
+    return openstack.connect(
+        auth_url=_env['OS_AUTH_URL'],
+        username=_env['OS_USERNAME'],
+        password=_env['OS_PASSWORD'],
+        project_name=_env['OS_PROJECT_NAME'],
+        user_domain_name=_env['OS_USER_DOMAIN_NAME'],
+        project_domain_name=_env['OS_PROJECT_DOMAIN_NAME'],
+        identity_api_version=_env['OS_IDENTITY_API_VERSION'],
+        load_envvars=False,
+        load_yaml_config=False,
+    )
+
+
+# Resource types listed by _resource_names.
+_RESOURCE_LISTS = {
+    'user': lambda conn: conn.identity.users(),
+    'service': lambda conn: conn.identity.services(),
+    'flavor': lambda conn: conn.compute.flavors(),
+    'network': lambda conn: conn.network.networks(),
+    'subnet': lambda conn: conn.network.subnets(),
+    'router': lambda conn: conn.network.routers(),
+}
+
+
+def _resource_names(resource, attribute='name'):
+    """Get an attribute of all OpenStack resources of a type.
+
+    :param resource: the resource type, e.g. user or network.
+    :param attribute: the attribute to get the values of, e.g. name or type.
+    """
+    return {getattr(item, attribute)
+            for item in _RESOURCE_LISTS[resource](_openstack_connection())}
+
+
+# Set when config values have been saved but not yet written out to the
+# config files by 'snap-openstack setup'.
+_setup_pending = False
+
+
+def setup():
+    """Write out config files and load any changes to microstack.rc."""
+    global _setup_pending
+
+    check('snap-openstack', 'setup')
+    _setup_pending = False
+
+    # TODO: get rid of this? (I think that it has become redundant)
+    reload_env()
+
+
+def flush():
+    """Write out config files if any ConfigQuestion has been answered since
+    they were last written.
+    """
+    if _setup_pending:
+        setup()
+
 
 class ConfigError(Exception):
     """Suitable error to raise in case there is an issue with the snapctl
@@ -59,6 +269,9 @@ class Clustering(Question):
     role_interactive = True
 
     def yes(self, answer: bool):
+        from init import cluster_tls
+        from init.questions import clustering
+
         log.info('Configuring clustering ...')
 
         role_question = clustering.Role()
@@ -90,6 +303,9 @@ class Clustering(Question):
             log.info('Setting up as a compute node.')
             # Gets config info and sets local env vals.
             check_output('microstack_join')
+            # microstack_join has updated the snap config on its own.
+            shell.config_invalidate()
+            shell.config_prefetch('config')
             shell.config_set(**{
                 'config.services.control-plane': 'false',
                 'config.services.hypervisor': 'true',
@@ -101,11 +317,13 @@ class Clustering(Question):
                 'config.services.control-plane': 'true',
                 'config.services.hypervisor': 'true',
             })
-            # Generate a self-signed certificate for the clustering service.
-            cluster_tls.generate_selfsigned()
+            # Generate a self-signed certificate for the clustering service
+            # unless a usable one is left from a previous run.
+            if not cluster_tls.has_valid_cert():
+                cluster_tls.generate_selfsigned()
 
         # Write templates
-        check('snap-openstack', 'setup')
+        setup()
 
     def no(self, answer: bool):
         disable('cluster-uwsgi')
@@ -122,24 +340,13 @@ class ConfigQuestion(Question):
     def after(self, answer):
         """Our value has been saved.
 
-        Run 'snap-openstack setup' to write it out, and load any changes to
-        microstack.rc.
-
-        # TODO this is a bit messy and redundant. Come up with a clean
-        way of loading and writing config after the run of
-        ConfigQuestions have been asked.
+        Mark the config files as stale: 'snap-openstack setup' is run once
+        by flush() after a run of ConfigQuestions has been asked rather
+        than after every one of them.
 
         """
-        check('snap-openstack', 'setup')
-
-        # TODO: get rid of this? (I think that it has become redundant)
-        mstackrc = '{SNAP_COMMON}/etc/microstack.rc'.format(**_env)
-        with open(mstackrc, 'r') as rc_file:
-            for line in rc_file.readlines():
-                if not line.startswith('export'):
-                    continue
-                key, val = line[7:].split('=')
-                _env[key.strip()] = val.strip()
+        global _setup_pending
+        _setup_pending = True
 
 
 class DnsServers(ConfigQuestion):
@@ -182,55 +389,53 @@ class NetworkSettings(Question):
     def yes(self, answer):
         log.info('Configuring networking ...')
 
-        role = check_output('snapctl', 'get', 'config.cluster.role')
+        role = shell.config_get('config.cluster.role')
 
         # Enable and start the services.
-        enable('ovsdb-server')
-        enable('ovs-vswitchd')
-        enable('ovn-ovsdb-server-sb')
-        enable('ovn-ovsdb-server-nb')
+        enable(
+            'ovsdb-server',
+            'ovs-vswitchd',
+            'ovn-ovsdb-server-sb',
+            'ovn-ovsdb-server-nb',
+        )
 
         network.ExtGateway().ask()
         network.ExtCidr().ask()
 
-        control_ip = check_output('snapctl', 'get',
-                                  'config.network.control-ip')
+        # ExtGateway may have changed the addresses on a single node, so
+        # they are only read now.
+        net_config = shell.config_get('config.network.control-ip',
+                                      'config.network.compute-ip')
+        control_ip = net_config['config.network.control-ip']
         if role == 'control':
-            nb_conn = 'unix:{SNAP_COMMON}/run/ovn/ovnnb_db.sock'.format(**_env)
-            sb_conn = 'unix:{SNAP_COMMON}/run/ovn/ovnsb_db.sock'.format(**_env)
-            check_output('ovs-vsctl', 'set', 'open', '.',
-                         f'external-ids:ovn-encap-ip={control_ip}')
+            nb_conn = _paths.ovn_nb_socket
+            sb_conn = _paths.ovn_sb_socket
+            encap_ip = control_ip
         elif role == 'compute':
             sb_conn = f'tcp:{control_ip}:6642'
             # Not used by any compute node services.
             nb_conn = ''
-            compute_ip = check_output('snapctl', 'get',
-                                      'config.network.compute-ip')
-            # Set the IP address to be used for a tunnel endpoint.
-            check_output('ovs-vsctl', 'set', 'open', '.',
-                         f'external-ids:ovn-encap-ip={compute_ip}')
+            # Use the compute node IP address for a tunnel endpoint.
+            encap_ip = net_config['config.network.compute-ip']
         else:
             raise Exception(f'Unexpected node role: {role}')
 
-        # ovn-controller does not start unless both the ovn-encap-ip and the
-        # ovn-encap-type are set.
-        check_output('ovs-vsctl', 'set', 'open', '.',
-                     'external-ids:ovn-encap-type=geneve')
-
         # Configure OVN SB and NB sockets based on the role node. For
         # single-node deployments there is no need to use a TCP socket.
-        check_output('snapctl', 'set',
-                     f'config.network.ovn-nb-connection={nb_conn}')
-        check_output('snapctl', 'set',
-                     f'config.network.ovn-sb-connection={sb_conn}')
+        shell.config_set(**{
+            'config.network.ovn-nb-connection': nb_conn,
+            'config.network.ovn-sb-connection': sb_conn,
+        })
 
-        # Set SB database connection details for ovn-controller to pick up.
-        check_output(
-                'ovs-vsctl', 'set', 'open', '.',
-                f'external-ids:ovn-remote={sb_conn}'
-        )
+        # Set the tunnel endpoint and SB database connection details for
+        # ovn-controller to pick up in a single OVSDB transaction.
+        # ovn-controller does not start unless both the ovn-encap-ip and the
+        # ovn-encap-type are set.
         check_output(
                 'ovs-vsctl', 'set', 'open', '.',
+                f'external-ids:ovn-encap-ip={encap_ip}',
+                'external-ids:ovn-encap-type=geneve',
+                f'external-ids:ovn-remote={sb_conn}',
                 'external-ids:ovn-cms-options=enable-chassis-as-gw'
         )
 
@@ -238,12 +443,11 @@ class NetworkSettings(Question):
         # bridge and write all the proper values into our config
         # files.
         check('setup-br-ex')
-        check('snap-openstack', 'setup')
+        setup()
 
         if role == 'control':
 
-            enable('ovn-northd')
-            enable('ovn-controller')
+            enable('ovn-northd', 'ovn-controller')
 
         network.IpForwarding().ask()
 
@@ -296,11 +500,9 @@ class RabbitMq(Question):
 
     def _wait(self) -> None:
         enable('rabbitmq-server')
-        rabbit_port = check_output(
-            'snapctl', 'get', 'config.network.ports.rabbit')
+        rabbit_port = shell.config_get('config.network.ports.rabbit')
         nc_wait(_env['control_ip'], rabbit_port)
-        log_file = '{SNAP_COMMON}/log/rabbitmq/startup_log'.format(**_env)
-        log_wait(log_file, 'completed')
+        log_wait(_paths.rabbitmq_startup_log, 'completed')
 
     def _configure(self) -> None:
         """Configure RabbitMQ
@@ -308,7 +510,7 @@ class RabbitMq(Question):
         (actions may have already been run, in which case we fail silently).
         """
         # Configure RabbitMQ
-        check('{SNAP}/bin/setup-rabbit'.format(**_env))
+        check(_paths.setup_rabbit)
 
     def yes(self, answer: str) -> None:
         log.info('Waiting for RabbitMQ to start ...')
@@ -329,40 +531,47 @@ class DatabaseSetup(Question):
     _type = 'boolean'
     config_key = 'config.services.control-plane'
 
+    # (service user, database) pairs.
+    DATABASES = (
+        ('neutron', 'neutron'),
+        ('nova', 'nova'),
+        ('nova', 'nova_api'),
+        ('nova', 'nova_cell0'),
+        ('cinder', 'cinder'),
+        ('glance', 'glance'),
+        ('keystone', 'keystone'),
+        ('placement', 'placement'),
+    )
+
     def _wait(self) -> None:
         enable('mysqld')
-        mysql_port = check_output(
-            'snapctl', 'get', 'config.network.ports.mysql')
+        mysql_port = shell.config_get('config.network.ports.mysql')
         nc_wait(_env['control_ip'], mysql_port)
-        log_wait('{SNAP_COMMON}/log/mysql/error.log'.format(**_env),
-                 'mysqld: ready for connections.')
+        log_wait(_paths.mysql_error_log, 'mysqld: ready for connections.')
 
     def _create_dbs(self) -> None:
         db_creds = shell.config_get('config.credentials')
-        for service_user, db_name in (
-            ('neutron', 'neutron'),
-            ('nova', 'nova'),
-            ('nova', 'nova_api'),
-            ('nova', 'nova_cell0'),
-            ('cinder', 'cinder'),
-            ('glance', 'glance'),
-            ('keystone', 'keystone'),
-            ('placement', 'placement')
-        ):
-            db_password = db_creds[f'{service_user}-password']
-            sql("CREATE USER IF NOT EXISTS '{user}'@'%'"
-                " IDENTIFIED BY '{db_password}';".format(
-                    user=service_user, db_password=db_password, **_env))
-            sql("CREATE DATABASE IF NOT EXISTS `{db}`;".format(db=db_name))
-            sql("GRANT ALL PRIVILEGES ON {db}.* TO '{user}'@'%';"
-                "".format(db=db_name, user=service_user, **_env))
+        passwords = {user: db_creds[f'{user}-password']
+                     for user, _ in self.DATABASES}
+        # Create every user once, then the databases and grants, all over
+        # a single connection.
+        statements = [
+            f"CREATE USER IF NOT EXISTS '{user}'@'%'"
+            f" IDENTIFIED BY '{password}';"
+            for user, password in passwords.items()
+        ]
+        for user, db in self.DATABASES:
+            statements.append(f"CREATE DATABASE IF NOT EXISTS `{db}`;")
+            statements.append(
+                f"GRANT ALL PRIVILEGES ON `{db}`.* TO '{user}'@'%';")
+        sql(*statements)
 
     def _bootstrap(self) -> None:
 
-        if call('openstack', 'user', 'show', 'admin'):
+        if call('openstack', 'user', 'show', 'admin', quiet=True):
             return
 
-        bootstrap_url = 'http://{control_ip}:5000/v3/'.format(**_env)
+        bootstrap_url = f'http://{_env["control_ip"]}:5000/v3/'
 
         check('snap-openstack', 'launch', 'keystone-manage', 'bootstrap',
               '--bootstrap-password', _env['keystone_password'],
@@ -383,7 +592,7 @@ class DatabaseSetup(Question):
         log.info('Mysql server started! Creating databases ...')
         self._create_dbs()
 
-        check('snapctl', 'set', 'database.ready=true')
+        shell.config_set(**{'database.ready': 'true'})
 
         enable('nginx')
 
@@ -399,7 +608,8 @@ class DatabaseSetup(Question):
         self._bootstrap()
 
         log.info('Creating service project ...')
-        if not call('openstack', 'project', 'show', 'service'):
+        if not call('openstack', 'project', 'show', 'service',
+                    quiet=True):
             check('openstack', 'project', 'create', '--domain',
                   'default', '--description', 'Service Project',
                   'service')
@@ -408,7 +618,7 @@ class DatabaseSetup(Question):
 
     def no(self, answer: str):
         # We assume that the control node has a connection setup for us.
-        check('snapctl', 'set', 'database.ready=true')
+        shell.config_set(**{'database.ready': 'true'})
 
         log.info('Disabling local MySQL ...')
         disable('mysqld')
@@ -423,15 +633,11 @@ class NovaHypervisor(Question):
     def yes(self, answer):
         log.info('Configuring nova compute hypervisor ...')
         self._maybe_enable_emulation()
-        enable('libvirtd')
-        enable('virtlogd')
-        enable('nova-compute')
+        enable('libvirtd', 'virtlogd', 'nova-compute')
 
     def no(self, answer):
         log.info('Disabling nova compute service ...')
-        disable('libvirtd')
-        disable('virtlogd')
-        disable('nova-compute')
+        disable('libvirtd', 'virtlogd', 'nova-compute')
 
     def _maybe_enable_emulation(self):
         log.info('Checking virtualization extensions presence on the host')
@@ -440,35 +646,35 @@ class NovaHypervisor(Question):
         if self._is_hw_virt_supported():
             log.info('Hardware virtualization is supported - KVM will be used'
                      ' for Nova instances')
-            shell.config_set(**{'config.nova.virt-type': 'kvm'})
-            shell.config_set(**{'config.nova.cpu-mode': 'host-passthrough'})
+            shell.config_set(**{
+                'config.nova.virt-type': 'kvm',
+                'config.nova.cpu-mode': 'host-passthrough',
+            })
         else:
             log.warning('Hardware virtualization is not supported - software'
                         ' emulation will be used for Nova instances')
-            shell.config_set(**{'config.nova.virt-type': 'qemu'})
-            shell.config_set(**{'config.nova.cpu-mode': 'host-passthrough'})
+            shell.config_set(**{
+                'config.nova.virt-type': 'qemu',
+                'config.nova.cpu-mode': 'host-passthrough',
+            })
 
     @staticmethod
     def _is_hw_virt_supported():
-        # Sample lscpu outputs: util-linux/tests/expected/lscpu/
-        cpu_info = json.loads(check_output('lscpu', '-J'))['lscpu']
-        architecture = next(filter(lambda x: x['field'] == 'Architecture:',
-                                   cpu_info), None)['data'].split()
-        flags = next(filter(lambda x: x['field'] == 'Flags:', cpu_info),
-                     None)
-        if flags is not None:
-            flags = flags['data'].split()
-
-        vendor_id = next(filter(lambda x: x['field'] == 'Vendor ID:',
-                                cpu_info), None)
-        if vendor_id is not None:
-            vendor_id = vendor_id['data']
+        fields = _lscpu_fields()
+        architecture = fields['Architecture:'].strip()
 
         # Mimic virt-host-validate code (from libvirt) and assume nested
         # support on ppc64 LE or BE.
-        if architecture in ['ppc64', 'ppc64le']:
+        if architecture in ('ppc64', 'ppc64le'):
             return True
-        elif vendor_id is not None and flags is not None:
+
+        flags = fields.get('Flags:')
+        if flags is not None:
+            flags = set(flags.split())
+
+        vendor_id = fields.get('Vendor ID:')
+
+        if vendor_id is not None and flags is not None:
             if vendor_id == 'AuthenticAMD' and 'svm' in flags:
                 return True
             elif vendor_id == 'GenuineIntel' and 'vmx' in flags:
@@ -518,7 +724,7 @@ class PlacementSetup(Question):
     def yes(self, answer: str) -> None:
         log.info('Configuring the Placement service...')
 
-        if not call('openstack', 'user', 'show', 'placement'):
+        if 'placement' not in _resource_names('user'):
             check(
                 'openstack', 'user', 'create', '--domain', 'default',
                 '--password',
@@ -528,15 +734,13 @@ class PlacementSetup(Question):
             check('openstack', 'role', 'add', '--project', 'service',
                   '--user', 'placement', 'admin')
 
-        if not call('openstack', 'service', 'show', 'placement'):
+        if 'placement' not in _resource_names('service', 'type'):
             check('openstack', 'service', 'create', '--name',
                   'placement', '--description', '"Placement API"',
                   'placement')
 
-            for endpoint in ['public', 'internal', 'admin']:
-                call('openstack', 'endpoint', 'create', '--region',
-                     'microstack', 'placement', endpoint,
-                     'http://{control_ip}:8778'.format(**_env))
+            _create_endpoints(call, 'placement',
+                              f'http://{_env["control_ip"]}:8778')
 
         log.info('Running Placement DB migrations...')
         check('snap-openstack', 'launch', 'placement-manage', 'db', 'sync')
@@ -553,30 +757,30 @@ class NovaControlPlane(Question):
     _type = 'boolean'
     config_key = 'config.services.control-plane'
 
+    # Default flavors: (name, id, ram in MiB, disk in GiB, vcpus).
+    FLAVORS = (
+        ('m1.tiny', '1', '512', '1', '1'),
+        ('m1.small', '2', '2048', '20', '1'),
+        ('m1.medium', '3', '4096', '20', '2'),
+        ('m1.large', '4', '8192', '20', '4'),
+        ('m1.xlarge', '5', '16384', '20', '8'),
+    )
+
     def _flavors(self) -> None:
         """Create default flavors."""
 
-        if not call('openstack', 'flavor', 'show', 'm1.tiny'):
-            check('openstack', 'flavor', 'create', '--id', '1',
-                  '--ram', '512', '--disk', '1', '--vcpus', '1', 'm1.tiny')
-        if not call('openstack', 'flavor', 'show', 'm1.small'):
-            check('openstack', 'flavor', 'create', '--id', '2',
-                  '--ram', '2048', '--disk', '20', '--vcpus', '1', 'm1.small')
-        if not call('openstack', 'flavor', 'show', 'm1.medium'):
-            check('openstack', 'flavor', 'create', '--id', '3',
-                  '--ram', '4096', '--disk', '20', '--vcpus', '2', 'm1.medium')
-        if not call('openstack', 'flavor', 'show', 'm1.large'):
-            check('openstack', 'flavor', 'create', '--id', '4',
-                  '--ram', '8192', '--disk', '20', '--vcpus', '4', 'm1.large')
-        if not call('openstack', 'flavor', 'show', 'm1.xlarge'):
-            check('openstack', 'flavor', 'create', '--id', '5',
-                  '--ram', '16384', '--disk', '20', '--vcpus', '8',
-                  'm1.xlarge')
+        existing = _resource_names('flavor')
+        _run_parallel(check, [
+            ('openstack', 'flavor', 'create', '--id', flavor_id,
+             '--ram', ram, '--disk', disk, '--vcpus', vcpus, name)
+            for name, flavor_id, ram, disk, vcpus in self.FLAVORS
+            if name not in existing
+        ])
 
     def yes(self, answer: str) -> None:
         log.info('Configuring nova control plane services ...')
 
-        if not call('openstack', 'user', 'show', 'nova'):
+        if 'nova' not in _resource_names('user'):
             check(
                 'openstack', 'user', 'create', '--domain', 'default',
                 '--password',
@@ -594,15 +798,15 @@ class NovaControlPlane(Question):
                  ' (this may take a lot of time)...')
         check('snap-openstack', 'launch', 'nova-manage', 'api_db', 'sync')
 
-        if 'cell0' not in check_output('snap-openstack', 'launch',
-                                       'nova-manage', 'cell_v2',
-                                       'list_cells'):
+        # Mapping cell0 does not affect cell1 so the cells only need to be
+        # listed once.
+        cells = check_output('snap-openstack', 'launch', 'nova-manage',
+                             'cell_v2', 'list_cells')
+        if 'cell0' not in cells:
             check('snap-openstack', 'launch', 'nova-manage',
                   'cell_v2', 'map_cell0')
 
-        if 'cell1' not in check_output('snap-openstack', 'launch',
-                                       'nova-manage', 'cell_v2', 'list_cells'):
-
+        if 'cell1' not in cells:
             check('snap-openstack', 'launch', 'nova-manage', 'cell_v2',
                   'create_cell', '--name=cell1', '--verbose')
 
@@ -610,27 +814,19 @@ class NovaControlPlane(Question):
                  ' (this may take a lot of time)...')
         check('snap-openstack', 'launch', 'nova-manage', 'db', 'sync')
 
-        enable('nova-api')
+        # snapd starts all services of one call together.
+        enable('nova-api', 'nova-api-metadata', 'nova-conductor',
+               'nova-scheduler')
         restart('nova-compute')
 
-        for service in [
-                'nova-api-metadata',
-                'nova-conductor',
-                'nova-scheduler',
-        ]:
-            enable(service)
-
         nc_wait(_env['compute_ip'], '8774')
+        http_wait(f'http://{_env["compute_ip"]}:8774/')
 
-        sleep(5)  # TODO: log_wait
-
-        if not call('openstack', 'service', 'show', 'compute'):
+        if 'compute' not in _resource_names('service', 'type'):
             check('openstack', 'service', 'create', '--name', 'nova',
                   '--description', '"Openstack Compute"', 'compute')
-            for endpoint in ['public', 'internal', 'admin']:
-                call('openstack', 'endpoint', 'create', '--region',
-                     'microstack', 'compute', endpoint,
-                     'http://{control_ip}:8774/v2.1'.format(**_env))
+            _create_endpoints(call, 'compute',
+                              f'http://{_env["control_ip"]}:8774/v2.1')
 
         log.info('Creating default flavors...')
 
@@ -639,12 +835,7 @@ class NovaControlPlane(Question):
     def no(self, answer):
         log.info('Disabling nova control plane services ...')
 
-        for service in [
-                'nova-api',
-                'nova-conductor',
-                'nova-scheduler',
-                'nova-api-metadata']:
-            disable(service)
+        disable(*sorted(_NOVA_CP_SERVICES))
 
 
 class CinderSetup(Question):
@@ -656,7 +847,7 @@ class CinderSetup(Question):
     def yes(self, answer: str) -> None:
         log.info('Configuring the Cinder services...')
 
-        if not call('openstack', 'user', 'show', 'cinder'):
+        if 'cinder' not in _resource_names('user'):
             check(
                 'openstack', 'user', 'create', '--domain', 'default',
                 '--password',
@@ -667,39 +858,32 @@ class CinderSetup(Question):
                   '--user', 'cinder', 'admin')
 
         control_ip = _env['control_ip']
-        for endpoint in ['public', 'internal', 'admin']:
-            for api_version in ['v2', 'v3']:
-                if not call('openstack', 'service', 'show',
-                            f'cinder{api_version}'):
-                    check('openstack', 'service', 'create', '--name',
-                          f'cinder{api_version}', '--description',
-                          f'"Cinder {api_version} API"',
-                          f'volume{api_version}')
-                if not check_output(
-                        'openstack', 'endpoint', 'list',
-                        '--service', f'volume{api_version}', '--interface',
-                        endpoint):
-                    check(
-                            'openstack', 'endpoint', 'create', '--region',
-                            'microstack', f'volume{api_version}', endpoint,
-                            f'http://{control_ip}:8776/{api_version}/'
-                            '$(project_id)s'
-                    )
+        # Look up the existing services and endpoints once instead of
+        # querying them separately for every API version and interface.
+        services = _resource_names('service')
+        endpoints = _existing_endpoints()
+        api_versions = ['v2', 'v3']
+        _run_parallel(check, [
+            ('openstack', 'service', 'create', '--name',
+             f'cinder{api_version}', '--description',
+             f'"Cinder {api_version} API"', f'volume{api_version}')
+            for api_version in api_versions
+            if f'cinder{api_version}' not in services
+        ])
+        for api_version in api_versions:
+            _create_endpoints(
+                check, f'volume{api_version}',
+                f'http://{control_ip}:8776/{api_version}/$(project_id)s',
+                existing=endpoints)
         log.info('Running Cinder DB migrations...')
         check('snap-openstack', 'launch', 'cinder-manage', 'db', 'sync')
 
-        enable('cinder-uwsgi')
-        enable('cinder-scheduler')
+        enable('cinder-uwsgi', 'cinder-scheduler')
 
     def no(self, answer):
         log.info('Disabling Cinder services...')
 
-        for service in [
-                'cinder-uwsgi',
-                'cinder-scheduler',
-                'cinder-volume',
-                'cinder-backup']:
-            disable(service)
+        disable(*sorted(_CINDER_SERVICES))
 
 
 class CinderVolumeLVMSetup(Question):
@@ -712,22 +896,18 @@ class CinderVolumeLVMSetup(Question):
     interactive = True
 
     def yes(self, answer: bool) -> None:
-        check('snapctl', 'set',
-              f'config.cinder.setup-loop-based-cinder-lvm-backend'
-              f'={str(answer).lower()}')
+        shell.config_set(**{
+            'config.cinder.setup-loop-based-cinder-lvm-backend':
+                str(answer).lower(),
+        })
         log.info('Setting up cinder-volume service with the LVM backend...')
-        enable('setup-lvm-loopdev')
-        enable('cinder-volume')
-        enable('target')
-        enable('iscsid')
+        enable('setup-lvm-loopdev', 'cinder-volume', 'target', 'iscsid')
 
     def no(self, answer: bool) -> None:
-        check('snapctl', 'set', f'config.cinder.lvm.setup-file-backed-lvm='
-                                f'{str(answer).lower()}')
-        disable('setup-lvm-loopdev')
-        disable('cinder-volume')
-        disable('iscsid')
-        disable('target')
+        shell.config_set(**{
+            'config.cinder.lvm.setup-file-backed-lvm': str(answer).lower(),
+        })
+        disable('setup-lvm-loopdev', 'cinder-volume', 'iscsid', 'target')
 
 
 class NeutronControlPlane(Question):
@@ -739,7 +919,7 @@ class NeutronControlPlane(Question):
     def yes(self, answer: str) -> None:
         log.info('Configuring Neutron')
 
-        if not call('openstack', 'user', 'show', 'neutron'):
+        if 'neutron' not in _resource_names('user'):
             check(
                 'openstack', 'user', 'create', '--domain', 'default',
                 '--password',
@@ -748,40 +928,39 @@ class NeutronControlPlane(Question):
             check('openstack', 'role', 'add', '--project', 'service',
                   '--user', 'neutron', 'admin')
 
-        if not call('openstack', 'service', 'show', 'network'):
+        if 'network' not in _resource_names('service', 'type'):
             check('openstack', 'service', 'create', '--name', 'neutron',
                   '--description', '"OpenStack Network"', 'network')
-            for endpoint in ['public', 'internal', 'admin']:
-                call('openstack', 'endpoint', 'create', '--region',
-                     'microstack', 'network', endpoint,
-                     'http://{control_ip}:9696'.format(**_env))
+            _create_endpoints(call, 'network',
+                              f'http://{_env["control_ip"]}:9696')
 
         check('snap-openstack', 'launch', 'neutron-db-manage', 'upgrade',
               'head')
-        enable('neutron-api')
-        enable('neutron-ovn-metadata-agent')
+        enable('neutron-api', 'neutron-ovn-metadata-agent')
 
         nc_wait(_env['control_ip'], '9696')
+        http_wait(f'http://{_env["control_ip"]}:9696/')
 
-        sleep(5)  # TODO: log_wait
+        networks = _resource_names('network')
+        subnets = _resource_names('subnet')
 
-        if not call('openstack', 'network', 'show', 'test'):
+        if 'test' not in networks:
             check('openstack', 'network', 'create', 'test')
 
-        if not call('openstack', 'subnet', 'show', 'test-subnet'):
+        if 'test-subnet' not in subnets:
             check('openstack', 'subnet', 'create', '--network', 'test',
                   '--subnet-range', '192.168.222.0/24', 'test-subnet')
 
-        if not call('openstack', 'network', 'show', 'external'):
+        if 'external' not in networks:
             check('openstack', 'network', 'create', '--external',
                   '--provider-physical-network=physnet1',
                   '--provider-network-type=flat', 'external')
-        if not call('openstack', 'subnet', 'show', 'external-subnet'):
+        if 'external-subnet' not in subnets:
             check('openstack', 'subnet', 'create', '--network', 'external',
                   '--subnet-range', _env['extcidr'], '--no-dhcp',
                   'external-subnet')
 
-        if not call('openstack', 'router', 'show', 'test-router'):
+        if 'test-router' not in _resource_names('router'):
             check('openstack', 'router', 'create', 'test-router')
             check('openstack', 'router', 'add', 'subnet', 'test-router',
                   'test-subnet')
@@ -794,23 +973,11 @@ class NeutronControlPlane(Question):
 
         """
         # Make sure the necessary services are enabled and started.
-        for service in [
-                'ovs-vswitchd',
-                'ovsdb-server',
-                'ovn-controller',
-                'neutron-ovn-metadata-agent'
-        ]:
-            enable(service)
-            restart(service)
+        enable(*_NEUTRON_COMPUTE_SERVICES)
+        restart(*_NEUTRON_COMPUTE_SERVICES)
 
         # Disable the other services.
-        for service in [
-                'neutron-api',
-                'ovn-northd',
-                'ovn-ovsdb-server-sb',
-                'ovn-ovsdb-server-nb',
-        ]:
-            disable(service)
+        disable(*sorted(_NEUTRON_CP_SERVICES))
 
 
 class GlanceSetup(Question):
@@ -819,28 +986,44 @@ class GlanceSetup(Question):
     _type = 'boolean'
     config_key = 'config.services.control-plane'
 
+    CIRROS_VERSION = '0.4.0'
+
+    def _create_user(self) -> None:
+        if _openstack_connection().identity.find_user('glance') is None:
+            check(
+                'openstack', 'user', 'create', '--domain', 'default',
+                '--password',
+                shell.config_get('config.credentials.glance-password'),
+                'glance'
+            )
+            check('openstack', 'role', 'add', '--project', 'service',
+                  '--user', 'glance', 'admin')
+
+    def _create_service(self) -> None:
+        services = _openstack_connection().identity.services(type='image')
+        if next(iter(services), None) is None:
+            check('openstack', 'service', 'create', '--name', 'glance',
+                  '--description', '"OpenStack Image"', 'image')
+            _create_endpoints(check, 'image',
+                              f'http://{_env["compute_ip"]}:9292')
+
     def _fetch_cirros(self) -> None:
 
-        if call('openstack', 'image', 'show', 'cirros'):
+        if _openstack_connection().image.find_image('cirros') is not None:
             return
 
         log.info('Adding cirros image ...')
 
-        env = dict(**_env)
-        env['VER'] = '0.4.0'
-        env['IMG'] = 'cirros-{VER}-x86_64-disk.img'.format(**env)
-
-        cirros_path = '{SNAP_COMMON}/images/{IMG}'.format(**env)
+        image = f'cirros-{self.CIRROS_VERSION}-x86_64-disk.img'
+        url = f'http://download.cirros-cloud.net/{self.CIRROS_VERSION}/{image}'
+        cirros_path = f'{_paths.images_dir}/{image}'
 
         if not path.exists(cirros_path):
-            check('mkdir', '-p', '{SNAP_COMMON}/images'.format(**env))
+            os.makedirs(_paths.images_dir, exist_ok=True)
             log.info('Downloading cirros image ...')
-            download(
-                'http://download.cirros-cloud.net/{VER}/{IMG}'.format(**env),
-                '{SNAP_COMMON}/images/{IMG}'.format(**env))
+            download(url, cirros_path)
 
-        check('openstack', 'image', 'create', '--file',
-              '{SNAP_COMMON}/images/{IMG}'.format(**env),
+        check('openstack', 'image', 'create', '--file', cirros_path,
               '--public', '--container-format=bare',
               '--disk-format=qcow2', 'cirros')
 
@@ -848,42 +1031,22 @@ class GlanceSetup(Question):
 
         log.info('Configuring Glance ...')
 
-        if not call('openstack', 'user', 'show', 'glance'):
-            check(
-                'openstack', 'user', 'create', '--domain', 'default',
-                '--password',
-                shell.config_get('config.credentials.glance-password'),
-                'glance'
-            )
-            check('openstack', 'role', 'add', '--project', 'service',
-                  '--user', 'glance', 'admin')
-
-        if not call('openstack', 'service', 'show', 'image'):
-            check('openstack', 'service', 'create', '--name', 'glance',
-                  '--description', '"OpenStack Image"', 'image')
-            for endpoint in ['internal', 'admin', 'public']:
-                check('openstack', 'endpoint', 'create', '--region',
-                      'microstack', 'image', endpoint,
-                      'http://{compute_ip}:9292'.format(**_env))
+        # The user and the service (with its endpoints) are independent
+        # Keystone resources.
+        _call_parallel(self._create_user, self._create_service)
 
         check('snap-openstack', 'launch', 'glance-manage', 'db_sync')
         # TODO: remove the glance registry
         # https://blueprints.launchpad.net/glance/+spec/deprecate-registry
-        for service in [
-                'glance-api',
-                'registry',
-        ]:
-            enable(service)
+        enable('glance-api', 'registry')
 
         nc_wait(_env['compute_ip'], '9292')
-
-        sleep(5)  # TODO: log_wait
+        http_wait(f'http://{_env["compute_ip"]}:9292/')
 
         self._fetch_cirros()
 
     def no(self, answer):
-        disable('glance-api')
-        disable('registry')
+        disable('glance-api', 'registry')
 
 
 class SecurityRules(Question):
@@ -891,31 +1054,41 @@ class SecurityRules(Question):
 
     _type = 'boolean'
     config_key = 'config.network.security-rules'
+    # Set once the rules exist so that re-running init does not need to
+    # look them up again.
+    created_key = 'config.network.security-rules-created'
 
     def yes(self, answer: str) -> None:
+        if shell.config_get(self.created_key):
+            return
+
         # Create security group rules
         log.info('Creating security group rules ...')
-        group_id = check_output('openstack', 'security', 'group', 'list',
-                                '--project', 'admin', '-f', 'value',
-                                '-c', 'ID')
-        rules = check_output('openstack', 'security', 'group', 'rule', 'list',
-                             '--format', 'json')
-        ping_rule = False
-        ssh_rule = False
-
-        for rule in json.loads(rules):
-            if rule['Security Group'] == group_id:
-                if rule['IP Protocol'] == 'icmp':
-                    ping_rule = True
-                if rule['IP Protocol'] == 'tcp':
-                    ssh_rule = True
-
-        if not ping_rule:
-            check('openstack', 'security', 'group', 'rule', 'create',
-                  group_id, '--proto', 'icmp')
-        if not ssh_rule:
-            check('openstack', 'security', 'group', 'rule', 'create',
-                  group_id, '--proto', 'tcp', '--dst-port', '22')
+        conn = _openstack_connection()
+        group = conn.network.find_security_group(
+            'default', project_id=conn.current_project_id,
+            ignore_missing=False)
+        # Only the group's own rules are requested and the listing is
+        # paginated, so stop as soon as both rules have been seen.
+        protocols = set()
+        for rule in conn.network.security_group_rules(
+                security_group_id=group.id):
+            protocols.add(rule.protocol)
+            if protocols >= {'icmp', 'tcp'}:
+                break
+
+        if 'icmp' not in protocols:
+            conn.network.create_security_group_rule(
+                security_group_id=group.id, direction='ingress',
+                ether_type='IPv4', remote_ip_prefix='0.0.0.0/0',
+                protocol='icmp')
+        if 'tcp' not in protocols:
+            conn.network.create_security_group_rule(
+                security_group_id=group.id, direction='ingress',
+                ether_type='IPv4', remote_ip_prefix='0.0.0.0/0',
+                protocol='tcp', port_range_min=22, port_range_max=22)
+
+        shell.config_set(**{self.created_key: 'true'})
 
 
 class PostSetup(Question):
@@ -927,19 +1100,16 @@ class PostSetup(Question):
         log.info('restarting libvirt and virtlogd ...')
         # This fixes an issue w/ logging not getting set.
         # TODO: fix issue.
-        restart('libvirtd')
-        restart('virtlogd')
-        restart('nova-compute')
+        restart('libvirtd', 'virtlogd', 'nova-compute')
 
         role = shell.config_get('config.cluster.role')
         if role == 'control':
             # TODO: since snap-openstack launch is used, this depends on the
             # database readiness and hence the clustering service is enabled
             # and started here. There needs to be a better way to do this.
-            enable('cluster-uwsgi')
-            enable('horizon-uwsgi')
+            enable('cluster-uwsgi', 'horizon-uwsgi')
 
-        check('snapctl', 'set', 'initialized=true')
+        shell.config_set(initialized='true')
         log.info('Complete. Marked microstack as initialized!')
 
 
@@ -948,14 +1118,12 @@ class SimpleServiceQuestion(Question):
     def yes(self, answer: str) -> None:
         log.info('enabling and starting ' + self.__class__.__name__)
 
-        for service in self.services:
-            enable(service)
+        enable(*self.services)
 
         log.info(self.__class__.__name__ + ' enabled')
 
     def no(self, answer):
-        for service in self.services:
-            disable(service)
+        disable(*self.services)
 
 
 class ExtraServicesQuestion(Question):
@@ -1,10 +1,11 @@
+import binascii
+import hashlib
+import ipaddress
 import logging
 import msgpack
 import re
-import netaddr
 import sys
 
-from cryptography.hazmat.primitives import hashes
 from typing import Tuple
 
 from init.questions.question import Question, InvalidAnswer
@@ -14,21 +15,30 @@ from init.shell import (
     config_set,
 )
 
-
-from oslo_serialization import (
-    base64,
-    msgpackutils
-)
+# Use SIMD-accelerated base64 routines where available.
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
 
 logger = logging.getLogger(__name__)
 
+# The fingerprint is the SHA256 digest of the clustering service certificate.
+_FINGERPRINT_LEN = hashlib.sha256().digest_size
+
+# A single hostname label.
+# See https://tools.ietf.org/html/rfc1035#section-2.3.1
+_HOSTNAME_LABEL_RE = re.compile(r'(?!-)[A-Z0-9-]{1,63}(?<!-)\Z', re.IGNORECASE)
+# The top-level domain must contain at least one non-numeric character.
+_TLD_ALPHA_RE = re.compile(r'[a-zA-Z-]')
+
 
 class Role(Question):
     _type = 'string'
     config_key = 'config.cluster.role'
     _question = ('Which role would you like to use for this node:'
                  ' "control" or "compute"?')
-    _valid_roles = ('control', 'compute')
+    _valid_roles = frozenset({'control', 'compute'})
     interactive = True
 
     def _input_func(self, prompt):
@@ -55,17 +65,23 @@ class ConnectionString(Question):
 
     def _validate(self, answer: str) -> Tuple[str, bool]:
         try:
-            conn_str_bytes = base64.decode_as_bytes(
-                answer.encode('ascii'))
-        except TypeError:
+            conn_str_bytes = base64.b64decode(
+                answer.strip().encode('ascii'), validate=True)
+        except UnicodeEncodeError:
             print('The connection string contains non-ASCII'
                   ' characters please make sure you entered'
                   ' it as returned by the add-compute command.',
                   file=sys.stderr)
             return answer, False
+        except binascii.Error:
+            print('The connection string is not valid base64'
+                  ' please make sure you entered'
+                  ' it as returned by the add-compute command.',
+                  file=sys.stderr)
+            return answer, False
 
         try:
-            conn_info = msgpackutils.loads(conn_str_bytes)
+            conn_info = msgpack.unpackb(conn_str_bytes, raw=False)
         except msgpack.exceptions.ExtraData:
             print('The connection string contains extra data'
                   ' characters please make sure you entered'
@@ -98,14 +114,11 @@ class ConnectionString(Question):
         # The input can be either an IPv4 or IPv6 address or a hostname.
         hostname = conn_info.get('hostname')
         try:
-            is_valid_address = self._validate_address(hostname)
-            is_valid_address = True
+            self._validate_address(hostname)
         except ValueError:
             logger.debug('The hostname specified in the connection string is'
                          ' not an IPv4 or IPv6 address - treating it as'
                          ' a hostname.')
-            is_valid_address = False
-        if not is_valid_address:
             try:
                 self._validate_hostname(hostname)
             except ValueError as e:
@@ -158,27 +171,34 @@ class ConnectionString(Question):
         if len(name) > 253:
             raise ValueError('The specified hostname is too long.')
 
-        allowed = re.compile('(?!-)[A-Z0-9-]{1,63}(?<!-)$', re.IGNORECASE)
-        if not re.search('[a-zA-Z-]', name.split(".")[-1]):
+        labels = name.split('.')
+        if not _TLD_ALPHA_RE.search(labels[-1]):
             raise ValueError(f'{hostname} contains no non-numeric characters'
                              ' in the top-level domain part of the hostname.')
-        if any((not allowed.match(x)) for x in name.split('.')):
-            raise ValueError('{hostname} is an invalid hostname.')
+        if not all(_HOSTNAME_LABEL_RE.match(label) for label in labels):
+            raise ValueError(f'{hostname} is an invalid hostname.')
 
     def _validate_address(self, address):
         if address is None:
             raise ValueError('An address has not been provided.')
-        if not (netaddr.valid_ipv4(address, netaddr.core.INET_PTON) or
-                netaddr.valid_ipv6(address, netaddr.core.INET_PTON)):
+        # ip_address also accepts integers, only textual addresses are
+        # valid here.
+        if not isinstance(address, str):
+            raise ValueError(f'{address} is not a valid IPv4 or IPv6 address.')
+        try:
+            ipaddress.ip_address(address)
+        except ValueError:
             raise ValueError(f'{address} is not a valid IPv4 or IPv6 address.')
 
     def _validate_fingerprint(self, fingerprint):
         # We expect a byte sequence equal to the SHA256 hash of the cert.
+        if not isinstance(fingerprint, bytes):
+            raise ValueError('A fingerprint has not been provided.')
         actual_len = len(fingerprint)
-        expected_len = hashes.SHA256.digest_size
-        if not actual_len == expected_len:
+        if actual_len != _FINGERPRINT_LEN:
             raise ValueError('The provided fingerprint has an invalid '
-                             f'length: {actual_len}, expected: {expected_len}')
+                             f'length: {actual_len}, expected: '
+                             f'{_FINGERPRINT_LEN}')
 
     def _validate_credential_id(self, credential_id):
         if credential_id is None:
@@ -1,9 +1,9 @@
 from init.config import Env, log
 from init.questions.question import Question
 from init.shell import (
-    check,
     config_get,
     config_set,
+    sysctl_set,
 )
 
 _env = Env().get_env()
@@ -56,7 +56,7 @@ class IpForwarding(Question):
         """Use sysctl to setup ip forwarding."""
         log.info('Setting up ipv4 forwarding...')
 
-        check('sysctl', 'net.ipv4.ip_forward=1')
+        sysctl_set({'net.ipv4.ip_forward': '1'})
 
     def no(self, answer: str) -> None:
         """This question doesn't actually work in a strictly confined snap, so
@@ -22,6 +22,7 @@ limitations under the License.
 """
 
 
+import json
 from typing import Tuple
 
 from init import shell
@@ -121,9 +122,16 @@ class Question():
         if self._type == 'auto':
             return
 
-        answer = shell.check_output(
-            'snapctl', 'get', '{key}'.format(key=self.config_key)
-        )
+        answer = shell.config_get(self.config_key)
+        # Unset keys and null values cannot be told apart in typed output;
+        # treat both as an empty default, the way an unset key was read.
+        if answer is None:
+            return ''
+        # Other non-string values are shown the way 'snapctl get' prints
+        # them.
+        if not isinstance(answer, str):
+            answer = json.dumps(answer)
+
         # Convert boolean values in to human friendly "yes" or "no"
         # values.
         if answer.strip().lower() == 'true':
@@ -156,8 +164,7 @@ class Question():
         if answer is None:
             answer = 'null'
 
-        shell.check('snapctl', 'set', '{key}={val}'.format(
-            key=self.config_key, val=answer))
+        shell.config_set(**{self.config_key: answer})
 
         return answer
 
@@ -202,7 +209,10 @@ class Question():
             choice=' (yes/no) ' if self._type == 'boolean' else ' ',
             default=default)
 
-        for i in range(0, self._retries):
+        # Without a user to ask, every attempt would validate the same
+        # default answer, so only make one.
+        retries = self._retries if self.interactive else 1
+        for i in range(0, retries):
             awr, valid = self._validate(
                 self._type == 'auto' or self._input_func(prompt) or default)
             if valid:
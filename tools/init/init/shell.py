@@ -1,8 +1,11 @@
 """shell.py
 
-Contains wrappers around subprocess and pymysql commands, specific to
+Contains wrappers around subprocess and MySQLdb commands, specific to
 our needs in the init script.
 
+The MySQLdb, netaddr and netifaces modules are only imported by the
+functions that use them, which keeps importing this module cheap.
+
 # TODO capture stdout (and output to log.DEBUG)
 
 ----------------------------------------------------------------------
@@ -23,22 +26,67 @@ limitations under the License.
 
 """
 
+import atexit
+import copy
+import ctypes
+import http.client
+import os
+import select
 import subprocess
-from time import sleep
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from time import monotonic, sleep
 from typing import Dict, List
 
-import netaddr
-import netifaces
-import pymysql
 import socket
-import wget
-import json
+
+# Use the faster msgspec JSON decoder where available.
+try:
+    from msgspec import DecodeError as JSONDecodeError
+    from msgspec.json import decode as json_loads, encode as json_dumps
+except ImportError:
+    from json import JSONDecodeError, dumps as json_dumps, loads as json_loads
 
 from init.config import Env, log
 
 
 _env = Env().get_env()
 
+# Values returned by config_get keyed by the tuple of requested keys.
+_config_cache = {}
+
+# Polling intervals (in seconds) used while waiting for services.
+WAIT_MIN_INTERVAL = 0.025
+WAIT_MAX_INTERVAL = 1
+LOG_WAIT_INTERVAL = 0.1
+NC_CONNECT_TIMEOUT = 5
+
+# The number of concurrent range requests used by download.
+DOWNLOAD_STREAMS = 4
+# Files smaller than this are downloaded with a single request.
+DOWNLOAD_MIN_RANGE_SIZE = 1 << 20
+DOWNLOAD_TIMEOUT = 60
+DOWNLOAD_BUFFER_SIZE = 1 << 20
+# Interrupted downloads are resumed this many times, backing off
+# exponentially up to DOWNLOAD_MAX_BACKOFF seconds between attempts.
+DOWNLOAD_ATTEMPTS = 100
+DOWNLOAD_MAX_BACKOFF = 10
+
+# The maximum number of bytes of command output read at once by _popen.
+POPEN_READ_SIZE = 1 << 16
+
+# snapd serves snapctl requests of confined snaps on this socket.
+SNAPD_SOCKET = '/run/snapd-snap.socket'
+# The socket timeout of requests other than starting, stopping and
+# restarting services, which wait for the services with no time limit
+# just like the snapctl binary.
+SNAPD_TIMEOUT = 60
+
+# A MySQL connection shared by sql() calls, see _sql_connection.
+_sql_conn = None
+
 
 def _popen(*args: List[str], env: Dict = _env):
     """Run a shell command, piping STDOUT and STDERR to our logger.
@@ -48,11 +96,18 @@ def _popen(*args: List[str], env: Dict = _env):
 
     """
     proc = subprocess.Popen(args, env=env, stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT, bufsize=1,
-                            universal_newlines=True, encoding='utf-8')
-    for line in iter(proc.stdout.readline, ''):
-        log.debug(line)
-
+                            stderr=subprocess.STDOUT)
+    # Read whatever output is available rather than a line at a time and
+    # log the complete lines of each read together.
+    pending = b''
+    for data in iter(lambda: proc.stdout.read1(POPEN_READ_SIZE), b''):
+        *lines, pending = (pending + data).split(b'\n')
+        if lines:
+            log.debug(b'\n'.join(lines).decode('utf-8', 'replace'))
+    if pending:
+        log.debug(pending.decode('utf-8', 'replace'))
+
+    proc.stdout.close()
     proc.wait()
     return proc
 
@@ -82,7 +137,7 @@ def check_output(*args: List[str], env: Dict = _env) -> str:
                                    universal_newlines=True).strip()
 
 
-def call(*args: List[str], env: Dict = _env) -> bool:
+def call(*args: List[str], env: Dict = _env, quiet: bool = False) -> bool:
     """Execute a shell command.
 
     Return True if the call executed successfully (returned 0), or
@@ -90,46 +145,275 @@ def call(*args: List[str], env: Dict = _env) -> bool:
 
     :param args: strings to be composed into the bash call.
     :param env: defaults to our Env singleton; can be overriden.
+    :param quiet: discard the output instead of logging it, e.g. for
+                  commands only run to probe whether something exists.
     """
+    if quiet:
+        return not subprocess.call(args, env=env,
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
     proc = _popen(*args, env=env)
     return not proc.returncode
 
 
-def sql(cmd: str) -> None:
+class _SnapdConnection(http.client.HTTPConnection):
+    """An HTTP connection to the snapd API on its Unix socket."""
+
+    def __init__(self, path: str = SNAPD_SOCKET,
+                 timeout: float = SNAPD_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+def _snapd_snapctl(context: str, args,
+                   timeout: float = SNAPD_TIMEOUT) -> str:
+    """Run a snapctl command by sending it to snapd directly, which is
+    what the snapctl binary does as well.
+
+    :param context: the context (cookie) identifying our snap to snapd.
+    :param args: the snapctl arguments.
+    :param timeout: the socket timeout in seconds or None to wait for as
+                    long as the command takes.
+    :return: the output of the command.
+    :raises subprocess.CalledProcessError: if the command failed.
+    """
+    body = json_dumps({'context-id': context, 'args': list(args)})
+    conn = _SnapdConnection(timeout=timeout)
+    try:
+        conn.request('POST', '/v2/snapctl', body=body,
+                     headers={'Content-Type': 'application/json'})
+        response = json_loads(conn.getresponse().read())
+    finally:
+        conn.close()
+    result = response.get('result') or {}
+    if response.get('type') == 'error':
+        value = result.get('value')
+        value = value if isinstance(value, dict) else {}
+        raise subprocess.CalledProcessError(
+            value.get('exit-code') or 1, ' '.join(('snapctl',) + tuple(args)),
+            output=value.get('stdout'),
+            stderr=value.get('stderr') or result.get('message'))
+    return (result.get('stdout') or '').strip()
+
+
+def _snapctl(*args: str, output: bool = True,
+             timeout: float = SNAPD_TIMEOUT) -> str:
+    """Run a snapctl command.
+
+    Inside the snap the request is sent to snapd over its socket rather
+    than by running the snapctl binary, which avoids a process per call.
+    Outside of it, e.g. in tests, the snapctl command is run.
+
+    :param args: the snapctl arguments.
+    :param output: return the output of the command rather than logging it.
+    :param timeout: the timeout of requests sent to snapd in seconds or
+                    None to wait for as long as the command takes.
+    :raises subprocess.CalledProcessError: if the command failed.
+    """
+    context = _env.get('SNAP_COOKIE') or _env.get('SNAP_CONTEXT')
+    if context and os.path.exists(SNAPD_SOCKET):
+        stdout = _snapd_snapctl(context, args, timeout=timeout)
+        if output:
+            return stdout
+        if stdout:
+            log.debug(stdout)
+        return ''
+    if output:
+        return check_output('snapctl', *args)
+    check('snapctl', *args)
+    return ''
+
+
+def _sql_connection():
+    """Get a MySQL connection, opening it on first use."""
+    global _sql_conn
+    if _sql_conn is None:
+        import MySQLdb
+        mysql_conf = '{SNAP_COMMON}/etc/mysql/my.cnf'.format(**_env)
+        root_pasword = config_get('config.credentials.mysql-root-password')
+        _sql_conn = MySQLdb.connect(read_default_file=mysql_conf,
+                                    password=root_pasword)
+    return _sql_conn
+
+
+def _sql_close():
+    """Close the MySQL connection if it has been opened."""
+    global _sql_conn
+    if _sql_conn is not None:
+        import MySQLdb
+        try:
+            _sql_conn.close()
+        except MySQLdb.Error:
+            pass
+        _sql_conn = None
+
+
+atexit.register(_sql_close)
+
+
+def sql(*cmds: str) -> None:
     """Execute some SQL!
 
-    Really simply wrapper around a pymysql connection, suitable for
+    Really simply wrapper around a MySQLdb connection, suitable for
     passing the limited CREATE and GRANT commands that we need to pass
-    in our init script.
+    in our init script. The connection is kept open for subsequent calls
+    until the init script exits. The statements are DDL and account
+    management statements which MySQL commits implicitly, so each one
+    commits on its own and a failure leaves the earlier ones applied.
 
-    :param cmd: sql to execute.
+    :param cmds: sql statements to execute in order.
 
     """
-    mysql_conf = '{SNAP_COMMON}/etc/mysql/my.cnf'.format(**_env)
-    root_pasword = config_get('config.credentials.mysql-root-password')
-    connection = pymysql.connect(read_default_file=mysql_conf,
-                                 password=root_pasword)
+    import MySQLdb
+
+    if _sql_conn is None:
+        connection = _sql_connection()
+    else:
+        try:
+            connection = _sql_conn
+            connection.ping()
+        except MySQLdb.OperationalError:
+            # The server may have been restarted since the connection has
+            # been opened, try again once with a new connection.
+            _sql_close()
+            connection = _sql_connection()
 
     with connection.cursor() as cursor:
-        cursor.execute(cmd)
+        for cmd in cmds:
+            cursor.execute(cmd)
 
 
 def nc_wait(addr: str, port: str) -> None:
-    """Wait for a service to be answering on a port."""
+    """Wait for a service to be answering on a port.
+
+    Retry with an exponential backoff starting at WAIT_MIN_INTERVAL so that
+    services which come up quickly are not waited for a whole second.
+    """
     print('Waiting for {}:{}'.format(addr, port))
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    while sock.connect_ex((addr, int(port))) != 0:
-        sleep(1)
+    interval = WAIT_MIN_INTERVAL
+    while True:
+        # A socket cannot be reused for another connection attempt after
+        # a failed one so use a new socket each time. The timeout keeps
+        # a connection to an unreachable host from blocking for minutes.
+        try:
+            with socket.create_connection((addr, int(port)),
+                                          timeout=NC_CONNECT_TIMEOUT):
+                return
+        except OSError:
+            pass
+        sleep(interval)
+        interval = min(interval * 2, WAIT_MAX_INTERVAL)
+
+
+def http_wait(url: str, timeout: float = 60, interval: float = 0.25) -> None:
+    """Wait for an HTTP server to answer requests on a URL.
+
+    Accepting connections does not mean that an API service is ready to
+    serve requests yet, so poll it until it returns anything other than
+    a server error.
+
+    :param url: the URL to send GET requests to.
+    :param timeout: the number of seconds to wait before giving up.
+    :param interval: the number of seconds to sleep between attempts.
+    :raises TimeoutError: if the server has not answered in time.
+    """
+    print('Waiting for {}'.format(url))
+    # Requests go to local services so bypass any configured proxies.
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+    deadline = monotonic() + timeout
+    while True:
+        try:
+            with opener.open(url, timeout=interval + 5):
+                return
+        except urllib.error.HTTPError as e:
+            if e.code < 500:
+                return
+        except (urllib.error.URLError, OSError):
+            pass
+        if monotonic() >= deadline:
+            raise TimeoutError(f'{url} did not respond in {timeout} seconds')
+        sleep(interval)
+
+
+# inotify events that can mean new data in a log file.
+_IN_MODIFY = 0x002
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+
+
+def _inotify_watch(directory: str):
+    """Watch a directory for files being written, created or moved in.
+
+    :return: a non-blocking inotify file descriptor that becomes readable
+             on changes or None if inotify is not available.
+    """
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory),
+                              _IN_MODIFY | _IN_MOVED_TO | _IN_CREATE) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _inotify_wait(fd, timeout: float) -> None:
+    """Wait for inotify events or a timeout and discard the events."""
+    ready, _, _ = select.select([fd], [], [], timeout)
+    if ready:
+        try:
+            while os.read(fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
 
 
 def log_wait(log: str, message: str) -> None:
-    """Wait until a message appears in a log."""
-    while True:
-        with open(log, 'r') as log_file:
-            for line in log_file.readlines():
-                if message in line:
+    """Wait until a message appears in a log.
+
+    Only the data appended to the log since the previous check is read.
+    The log is checked whenever inotify reports a change in its directory
+    (and at least every WAIT_MAX_INTERVAL seconds in case an event is
+    missed) or every LOG_WAIT_INTERVAL seconds if inotify is unavailable.
+    """
+    needle = message.encode('utf-8')
+    position = 0
+    pending = b''
+    watch = _inotify_watch(os.path.dirname(log) or '.')
+    try:
+        while True:
+            try:
+                with open(log, 'rb') as log_file:
+                    if log_file.seek(0, 2) < position:
+                        # The log has been truncated or replaced.
+                        position = 0
+                        pending = b''
+                    log_file.seek(position)
+                    data = log_file.read()
+                    position = log_file.tell()
+            except FileNotFoundError:
+                data = b''
+            if data:
+                # Keep an incomplete last line around until it is complete.
+                *lines, pending = (pending + data).split(b'\n')
+                if any(needle in line for line in lines) or needle in pending:
                     return
-        sleep(1)
+            if watch is None:
+                sleep(LOG_WAIT_INTERVAL)
+            else:
+                _inotify_wait(watch, WAIT_MAX_INTERVAL)
+    finally:
+        if watch is not None:
+            os.close(watch)
 
 
 def start(service: str) -> None:
@@ -139,64 +423,332 @@ def start(service: str) -> None:
                     e.g. *rabbit*
 
     """
-    check('snapctl', 'start', 'microstack.{}'.format(service))
+    _snapctl('start', 'microstack.{}'.format(service), output=False,
+             timeout=None)
 
 
-def restart(service: str) -> None:
-    """Restart a microstack service.
+def restart(*services: str) -> None:
+    """Restart microstack services.
 
-    :param service: the service(s) to be restarted. Can contain wild cards.
-                    e.g. *rabbit*
+    :param services: the service(s) to be restarted. Can contain wild cards.
+                     e.g. *rabbit*
 
     """
-    check('snapctl', 'restart', 'microstack.{}'.format(service))
+    _snapctl('restart',
+             *['microstack.{}'.format(service) for service in services],
+             output=False, timeout=None)
 
 
-def enable(service: str) -> None:
-    """Disable and mask a service.
+def _services_in_use(*services: str) -> set:
+    """Names of the given microstack services that are enabled or active.
 
-    :param service: the service(s) to be enabled. Can contain wild cards.
-                    e.g. *rabbit*
+    The state is read with a single snapctl call every time rather than
+    cached since services are also started and stopped by other processes.
+    """
+    in_use = set()
+    output = _snapctl('services',
+                      *['microstack.{}'.format(service)
+                        for service in services])
+    for line in output.splitlines()[1:]:
+        name, startup, current = line.split()[:3]
+        if startup == 'enabled' or current == 'active':
+            in_use.add(name.partition('.')[2])
+    return in_use
+
+
+def enable(*services: str) -> None:
+    """Enable and start services.
+
+    :param services: the service(s) to be enabled. Can contain wild cards.
+                     e.g. *rabbit*. All of them are handled by a single
+                     snapctl call.
 
     """
-    check('snapctl', 'start', '--enable', 'microstack.{}'.format(service))
+    _snapctl('start', '--enable',
+             *['microstack.{}'.format(service) for service in services],
+             output=False, timeout=None)
 
 
-def disable(service: str) -> None:
-    """Disable and mask a service.
+def disable(*services: str) -> None:
+    """Disable and mask services.
 
-    :param service: the service(s) to be disabled. Can contain wild cards.
-                    e.g. *rabbit*
+    :param services: the service(s) to be disabled. Can contain wild cards.
+                     e.g. *rabbit*. All of them are handled by a single
+                     snapctl call. Unless wild cards are used, the current
+                     state is checked first and services that are already
+                     disabled and stopped are left alone.
 
     """
-    check('snapctl', 'stop', '--disable', 'microstack.{}'.format(service))
+    if not any('*' in s for s in services):
+        in_use = _services_in_use(*services)
+        services = [s for s in services if s in in_use]
+        if not services:
+            return
+    _snapctl('stop', '--disable',
+             *['microstack.{}'.format(service) for service in services],
+             output=False, timeout=None)
+
+
+_MISSING = object()
+
+
+def _config_cached(key):
+    """Get a memoized value of a key, possibly from a memoized document of
+    one of its parents.
+
+    :return: the value or _MISSING if it is not memoized.
+    """
+    if (key,) in _config_cache:
+        return _config_cache[(key,)]
+    parts = key.split('.')
+    for i in range(len(parts) - 1, 0, -1):
+        parent = _config_cache.get(('.'.join(parts[:i]),), _MISSING)
+        if parent is _MISSING:
+            continue
+        for part in parts[i:]:
+            # Unset keys are read as null.
+            parent = parent.get(part) if isinstance(parent, dict) else None
+        return parent
+    return _MISSING
 
 
 def config_get(*keys):
     """Get snap config keys via snapctl.
 
+    Values are memoized for the lifetime of the process: config_set updates
+    the memoized values and config_invalidate needs to be called after
+    the snap configuration is changed by other processes. Keys nested
+    under a memoized key, e.g. config.network.control-ip once config is
+    memoized, are served from memory as well.
+
     :param keys list[str]: Keys to retrieve from the snap configuration.
     :return: The parsed JSON document representation.
     :rtype: str or int or float or bool or dict or list
     """
-    if keys:
-        return json.loads(check_output('snapctl', 'get', '-t', *keys))
-    else:
+    if not keys:
         return None
+    if keys in _config_cache:
+        value = _config_cache[keys]
+    else:
+        cached = {key: _config_cached(key) for key in keys}
+        if _MISSING not in cached.values():
+            value = cached[keys[0]] if len(keys) == 1 else cached
+        else:
+            value = json_loads(_snapctl('get', '-t', *keys))
+            _config_cache[keys] = value
+    # Callers may modify returned dicts and lists.
+    return copy.deepcopy(value)
+
+
+def config_prefetch(*keys):
+    """Memoize several snap config keys with a single snapctl call.
+
+    Subsequent config_get calls for any one of the keys, or the keys
+    nested under them, are served from memory.
+
+    :param keys list[str]: Keys to retrieve from the snap configuration.
+    """
+    keys = tuple(dict.fromkeys(keys))
+    if len(keys) < 2:
+        # A single key is returned as a plain value rather than a document.
+        config_get(*keys)
+        return
+    values = json_loads(_snapctl('get', '-t', *keys))
+    for key in keys:
+        _config_cache[(key,)] = values.get(key)
+
+
+def _snapctl_value(value):
+    """Convert a value the way 'snapctl set' stores it: as JSON if it
+    parses as JSON, as a string otherwise.
+    """
+    value = str(value)
+    try:
+        return json_loads(value)
+    except JSONDecodeError:
+        return value
 
 
 def config_set(**kwargs):
     """Get snap config keys via snapctl.
 
+    Memoized documents of parents of the keys are updated in place so that
+    they can still be used afterwards; other memoized values of related
+    keys are forgotten.
+
     :param kwargs dict[str, str]: Values to set in the snap configuration.
     """
-    if kwargs:
-        check('snapctl', 'set', *[f'{k}={v}' for k, v in kwargs.items()])
+    if not kwargs:
+        return
+    _snapctl('set', *[f'{k}={v}' for k, v in kwargs.items()], output=False)
+    updated = set()
+    for key, value in kwargs.items():
+        parts = key.split('.')
+        for i in range(1, len(parts)):
+            parent = ('.'.join(parts[:i]),)
+            document = _config_cache.get(parent)
+            for part in parts[i:-1]:
+                if not isinstance(document, dict):
+                    break
+                document = document.setdefault(part, {})
+            if isinstance(document, dict):
+                document[parts[-1]] = _snapctl_value(value)
+                updated.add(parent)
+    _config_forget(kwargs, keep=updated)
+
+
+def _config_related(key, other):
+    """Whether one of the keys is the other one or nested under it."""
+    return (key == other or key.startswith(other + '.') or
+            other.startswith(key + '.'))
+
+
+def _config_forget(keys, keep=()):
+    """Forget memoized values related to any of the keys except the ones
+    memoized under the tuples in keep.
+    """
+    for cached in list(_config_cache):
+        if cached in keep:
+            continue
+        if any(_config_related(key, other)
+               for key in keys for other in cached):
+            del _config_cache[cached]
+
+
+def config_invalidate(*keys):
+    """Forget snap config values memoized by config_get.
+
+    :param keys list[str]: Forget only values of these keys and the ones
+                           nested under or above them. All values are
+                           forgotten if no keys are given.
+    """
+    if keys:
+        _config_forget(keys)
+    else:
+        _config_cache.clear()
+
+
+def _download_range(url: str, output: str, start: int = 0,
+                    end: int = None) -> None:
+    """Download bytes start to end (inclusive) of url into the same offsets
+    of the output file, resuming the transfer if it is interrupted.
+
+    If end is None the server does not support range requests, so the
+    whole file is downloaded and an interrupted transfer starts over.
+    """
+    position = start
+    # Read into one reusable buffer rather than a new bytes object per chunk.
+    buffer = memoryview(bytearray(DOWNLOAD_BUFFER_SIZE))
+    for attempt in range(DOWNLOAD_ATTEMPTS):
+        headers = {}
+        if end is None:
+            position = 0
+        else:
+            headers['Range'] = f'bytes={position}-{end}'
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request,
+                                        timeout=DOWNLOAD_TIMEOUT) as resp, \
+                    open(output, 'r+b') as out:
+                if end is not None and resp.status != 206:
+                    raise RuntimeError(
+                        f'{url} ignored the range request ({resp.status})')
+                if end is None:
+                    out.truncate()
+                out.seek(position)
+                expected = (end + 1 if end is not None else
+                            int(resp.headers.get('Content-Length', 0)))
+                while True:
+                    length = resp.readinto(buffer)
+                    if not length:
+                        break
+                    out.write(buffer[:length])
+                    position += length
+            if position >= expected:
+                return
+            error = 'connection closed early'
+        except urllib.error.HTTPError as e:
+            if e.code < 500:
+                raise
+            error = e
+        except (OSError, http.client.HTTPException) as e:
+            error = e
+        log.warning(f'Download of {url} interrupted at byte {position}:'
+                    f' {error}')
+        sleep(min(0.1 * 2 ** attempt, DOWNLOAD_MAX_BACKOFF))
+    raise urllib.error.URLError(
+        f'Failed to download {url} in {DOWNLOAD_ATTEMPTS} attempts')
 
 
 def download(url: str, output: str) -> None:
-    """Download a file to a path"""
-    wget.download(url, output)
+    """Download a file to a path.
+
+    The data is written to a .part file that is only renamed to the output
+    path once it is complete. If the server supports range requests the
+    file is split into DOWNLOAD_STREAMS parts which are fetched
+    concurrently.
+    """
+    head = urllib.request.Request(url, method='HEAD')
+    with urllib.request.urlopen(head, timeout=DOWNLOAD_TIMEOUT) as resp:
+        size = int(resp.headers.get('Content-Length', 0))
+        ranges = (resp.headers.get('Accept-Ranges') == 'bytes'
+                  and size > 0)
+        # Use the final URL so that redirects are followed only once.
+        url = resp.geturl()
+
+    partial = f'{output}.part'
+    with open(partial, 'wb') as out:
+        if ranges:
+            os.posix_fallocate(out.fileno(), 0, size)
+
+    if not ranges or size < DOWNLOAD_MIN_RANGE_SIZE:
+        _download_range(url, partial, 0, size - 1 if ranges else None)
+    else:
+        part = -(-size // DOWNLOAD_STREAMS)
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_STREAMS) as pool:
+            futures = [
+                pool.submit(_download_range, url, partial,
+                            start, min(start + part, size) - 1)
+                for start in range(0, size, part)
+            ]
+            for future in futures:
+                future.result()
+    os.rename(partial, output)
+
+
+def sysctl_set(settings: Dict[str, str]) -> None:
+    """Set kernel parameters by writing to /proc/sys directly.
+
+    This avoids a sysctl process per parameter; parameters which already
+    have the requested value are not written again.
+
+    :param settings: parameter names, e.g. net.ipv4.ip_forward, mapped to
+                     the values to set.
+    """
+    for key, value in settings.items():
+        path = '/proc/sys/{}'.format(key.replace('.', '/'))
+        with open(path) as current:
+            if current.read().strip() == str(value):
+                continue
+        with open(path, 'w') as parameter:
+            parameter.write(f'{value}\n')
+
+
+@lru_cache(maxsize=None)
+def _default_interface():
+    """Get the default gateway, interface and the first IPv4 address of
+    the interface.
+
+    The network configuration is not expected to change while init runs,
+    so it is only looked up once.
+
+    :return: a (gateway, interface, address dict) tuple.
+    """
+    import netifaces
+
+    gateway, interface = netifaces.gateways()['default'][netifaces.AF_INET][:2]
+    addresses = netifaces.ifaddresses(interface)[netifaces.AF_INET][0]
+    return gateway, interface, addresses
 
 
 def fallback_source_address():
@@ -207,8 +759,7 @@ def fallback_source_address():
     situation is unlikely but needs to be taken into account.
     '''
     try:
-        interface = netifaces.gateways()['default'][netifaces.AF_INET][1]
-        return netifaces.ifaddresses(interface)[netifaces.AF_INET][0]['addr']
+        return _default_interface()[2]['addr']
     except (KeyError, IndexError):
         log.exception('Failed to get ip address!')
         return None
@@ -223,13 +774,13 @@ def default_network():
     """Get info about the default netowrk.
 
     """
-    gateway, interface = netifaces.gateways()['default'][netifaces.AF_INET]
-    netmask = netifaces.ifaddresses(interface)[netifaces.AF_INET][0]['netmask']
-    ip_address = netifaces.ifaddresses(interface)[netifaces.AF_INET][0]['addr']
-    bits = netaddr.IPAddress(netmask).netmask_bits()
-    # TODO: better way to do this!
-    cidr = gateway.split('.')
-    cidr[-1] = '0/{}'.format(bits)
-    cidr = '.'.join(cidr)
+    import netaddr
+
+    gateway, _, addresses = _default_interface()
+    netmask = addresses['netmask']
+    ip_address = addresses['addr']
+    # The network address is not necessarily the gateway address with its
+    # last octet zeroed, e.g. for a /22 network.
+    cidr = str(netaddr.IPNetwork(f'{ip_address}/{netmask}').cidr)
 
     return ip_address, gateway, cidr
@@ -1,13 +1,9 @@
-import sys
-import os
 import unittest
 
 import mock
 
-# TODO: drop in test runner and get rid of this line.
-sys.path.append(os.getcwd())  # noqa
-
-from init.questions.question import (Question, InvalidQuestion, InvalidAnswer) # noqa
+from init import shell
+from init.questions.question import Question, InvalidQuestion, InvalidAnswer
 
 
 ##############################################################################
@@ -71,6 +67,10 @@ class TestQuestionClass(unittest.TestCase):
     Test basic features of the Question class.
 
     """
+    def setUp(self):
+        # Do not serve values memoized by other tests.
+        shell.config_invalidate()
+
     def test_invalid_type(self):
 
         with self.assertRaises(InvalidQuestion):
@@ -96,6 +96,10 @@ class TestInput(unittest.TestCase):
     class's input handler.
 
     """
+    def setUp(self):
+        # Do not serve values memoized by other tests.
+        shell.config_invalidate()
+
     @mock.patch('init.questions.question.shell.check_output')
     @mock.patch('init.questions.question.shell.check')
     def test_boolean_question(self, mock_check, mock_check_output):
@@ -118,7 +122,7 @@ class TestInput(unittest.TestCase):
     @mock.patch('init.questions.question.shell.check_output')
     @mock.patch('init.questions.question.shell.check')
     def test_string_question(self, mock_check, mock_check_output):
-        mock_check_output.return_value = 'somedefault'
+        mock_check_output.return_value = '"somedefault"'
 
         q = GoodStringQuestion()
 
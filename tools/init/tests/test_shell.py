@@ -0,0 +1,121 @@
+import unittest
+
+import mock
+
+from init import shell
+
+
+##############################################################################
+#
+# Tests Proper
+#
+##############################################################################
+
+
+@mock.patch('init.shell.check')
+@mock.patch('init.shell.check_output')
+class TestConfigMemo(unittest.TestCase):
+    """
+    Test the memoization of snap config values.
+
+    """
+    def setUp(self):
+        shell.config_invalidate()
+
+    def tearDown(self):
+        shell.config_invalidate()
+
+    def test_get_memoized(self, mock_check_output, mock_check):
+        mock_check_output.return_value = '"foo"'
+
+        self.assertEqual(shell.config_get('config.a'), 'foo')
+        self.assertEqual(shell.config_get('config.a'), 'foo')
+        mock_check_output.assert_called_once_with(
+            'snapctl', 'get', '-t', 'config.a')
+
+    def test_get_returns_copies(self, mock_check_output, mock_check):
+        mock_check_output.return_value = '{"b": [1]}'
+
+        shell.config_get('config.a')['b'].append(2)
+        self.assertEqual(shell.config_get('config.a'), {'b': [1]})
+
+    def test_invalidate_related(self, mock_check_output, mock_check):
+        mock_check_output.return_value = '"foo"'
+        shell.config_get('config.a.b')
+        shell.config_get('config.c')
+
+        shell.config_invalidate('config.a')
+        shell.config_get('config.a.b')
+        shell.config_get('config.c')
+        self.assertEqual(mock_check_output.call_count, 3)
+
+    def test_invalidate_all(self, mock_check_output, mock_check):
+        mock_check_output.return_value = '"foo"'
+        shell.config_get('config.a')
+        shell.config_get('config.c')
+
+        shell.config_invalidate()
+        shell.config_get('config.a')
+        shell.config_get('config.c')
+        self.assertEqual(mock_check_output.call_count, 4)
+
+    def test_nested_get_from_prefetched_parent(self, mock_check_output,
+                                               mock_check):
+        mock_check_output.return_value = (
+            '{"config": {"network": {"control-ip": "10.0.0.1"}},'
+            ' "other": 1}')
+        shell.config_prefetch('config', 'other')
+
+        self.assertEqual(shell.config_get('config.network.control-ip'),
+                         '10.0.0.1')
+        self.assertEqual(
+            shell.config_get('config.network.control-ip', 'other'),
+            {'config.network.control-ip': '10.0.0.1', 'other': 1})
+        # Unset keys are read as null, as snapctl does.
+        self.assertIsNone(shell.config_get('config.network.missing'))
+        self.assertIsNone(shell.config_get('config.network.control-ip.x'))
+        mock_check_output.assert_called_once_with(
+            'snapctl', 'get', '-t', 'config', 'other')
+
+    def test_set_updates_parent(self, mock_check_output, mock_check):
+        mock_check_output.return_value = '{"network": {"port": 1}}'
+        shell.config_get('config')
+
+        shell.config_set(**{'config.network.port': '2',
+                            'config.services.enabled': 'true',
+                            'config.network.name': 'foo'})
+        mock_check.assert_called_once_with(
+            'snapctl', 'set', 'config.network.port=2',
+            'config.services.enabled=true', 'config.network.name=foo')
+        self.assertEqual(shell.config_get('config'), {
+            'network': {'port': 2, 'name': 'foo'},
+            'services': {'enabled': True},
+        })
+        mock_check_output.assert_called_once()
+
+    def test_set_forgets_related(self, mock_check_output, mock_check):
+        mock_check_output.return_value = '"foo"'
+        shell.config_get('config.a.b')
+        shell.config_get('config.a.b', 'config.c')
+        shell.config_get('config.c')
+
+        shell.config_set(**{'config.a.b': 'bar'})
+        self.assertNotIn(('config.a.b',), shell._config_cache)
+        self.assertNotIn(('config.a.b', 'config.c'), shell._config_cache)
+        self.assertIn(('config.c',), shell._config_cache)
+
+    def test_snapctl_value(self, mock_check_output, mock_check):
+        self.assertEqual(shell._snapctl_value('1'), 1)
+        self.assertEqual(shell._snapctl_value(1.5), 1.5)
+        self.assertIs(shell._snapctl_value('true'), True)
+        # Values are passed to snapctl as str(value) and 'False' is not
+        # valid JSON, so snapctl stores it as a string.
+        self.assertEqual(shell._snapctl_value(False), 'False')
+        self.assertEqual(shell._snapctl_value('{"a": [1]}'), {'a': [1]})
+        self.assertEqual(shell._snapctl_value('10.0.0.1'), '10.0.0.1')
+        self.assertEqual(shell._snapctl_value('foo'), 'foo')
+        self.assertEqual(shell._snapctl_value(''), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import argparse
 import json
 import os
+import shlex
 import subprocess
 import time
 import sys
@@ -8,15 +9,6 @@ import sys
 from typing import List
 
 
-def check(*args: List[str]) -> int:
-    """Execute a shell command, raising an error on failed excution.
-
-    :param args: strings to be composed into the bash call.
-
-    """
-    return subprocess.check_call(args, env=os.environ)
-
-
 def check_output(*args: List[str]) -> str:
     """Execute a shell command, returning the output of the command.
 
@@ -28,6 +20,59 @@ def check_output(*args: List[str]) -> str:
                                    env=os.environ).strip()
 
 
+# Snap config values keyed by their keys. launch does not change the snap
+# configuration, so values are memoized for the lifetime of the process.
+_config_cache = {}
+
+
+def config_get(*keys):
+    """Get snap config keys via snapctl.
+
+    Keys which are not memoized yet are all fetched with a single snapctl
+    call.
+
+    :param keys: keys to retrieve from the snap configuration.
+    :return: the value of a single key or a dict of values of several keys.
+    """
+    missing = [key for key in keys if key not in _config_cache]
+    if len(missing) == 1:
+        _config_cache[missing[0]] = json.loads(
+            check_output('snapctl', 'get', '-t', missing[0]))
+    elif missing:
+        _config_cache.update(json.loads(
+            check_output('snapctl', 'get', '-t', *missing)))
+    if len(keys) == 1:
+        return _config_cache[keys[0]]
+    return {key: _config_cache[key] for key in keys}
+
+
+# A server is considered stuck if it has been building for longer than
+# BUILD_TIMEOUT seconds. Its status is polled at intervals growing from
+# BUILD_MIN_INTERVAL to BUILD_MAX_INTERVAL seconds.
+BUILD_TIMEOUT = 100
+BUILD_MIN_INTERVAL = 0.1
+BUILD_MAX_INTERVAL = 2
+
+# The openstacksdk connection shared by all API calls, see _connection.
+_conn = None
+
+
+def _connection():
+    """Get an openstacksdk connection, opening it on first use.
+
+    All API calls of a launch go through this connection, which keeps a
+    single authenticated session. openstack is imported lazily since it
+    takes a while to load. The connection is configured from the OS_*
+    variables of microstack.rc, so it can only be opened once these have
+    been loaded by main.
+    """
+    global _conn
+    if _conn is None:
+        import openstack
+        _conn = openstack.connect(load_yaml_config=False)
+    return _conn
+
+
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('image',
@@ -58,8 +103,7 @@ def check_keypair():
     Check for the microstack keypair's existence, creating it if it doesn't.
 
     """
-    key_path = check_output(
-        'snapctl', 'get', 'config.credentials.key-pair').format(**os.environ)
+    key_path = config_get('config.credentials.key-pair').format(**os.environ)
 
     if os.path.exists(key_path):
         return key_path
@@ -69,38 +113,59 @@ def check_keypair():
     # uninstall. If we don't, check to make sure that MicroStack
     # has a microstack ssh key, in addition to checking for the
     # existence of the file.
-    key_dir = os.sep.join(key_path.split(os.sep)[:-1])
-    check('mkdir', '-p', key_dir)
-    check('chmod', '700', key_dir)
+    key_dir = os.path.dirname(key_path)
+    os.makedirs(key_dir, exist_ok=True)
+    os.chmod(key_dir, 0o700)
 
-    id_ = check_output('openstack', 'keypair', 'create', 'microstack')
+    id_ = _connection().compute.create_keypair(name='microstack').private_key
 
-    with open(key_path, 'w') as file_:
+    # Create the file readable by its owner only so that the key is never
+    # exposed to other users.
+    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(fd, 'w') as file_:
         file_.write(id_)
-        check('chmod', '600', key_path)
+        os.fchmod(file_.fileno(), 0o600)
 
     return key_path
 
 
 def create_server(name, args):
 
-    cmd = [
-        'openstack', 'server', 'create',
-        '--flavor', args.flavor,
-        '--image', args.image,
-        '--nic', 'net-id={}'.format(args.net_id),
-        '--key-name', args.key,
-        name, '--format', 'json'
-    ]
+    conn = _connection()
+    # The image, flavor and network may be given by name or ID.
+    image = conn.image.find_image(args.image, ignore_missing=False)
+    flavor = conn.compute.find_flavor(args.flavor, ignore_missing=False)
+    network = conn.network.find_network(args.net_id, ignore_missing=False)
+
+    attrs = {}
     if args.availability_zone:
-        cmd += ['--availability-zone', args.availability_zone]
+        attrs['availability_zone'] = args.availability_zone
 
-    ret = json.loads(check_output(*cmd))
-    return ret['id']
+    server = conn.compute.create_server(
+        name=name, image_id=image.id, flavor_id=flavor.id,
+        networks=[{'uuid': network.id}], key_name=args.key, **attrs)
+    return server.id
 
 
 def delete_server(server_id):
-    check('openstack', 'server', 'delete', server_id)
+    _connection().compute.delete_server(server_id)
+
+
+def add_floating_ip(server_id):
+    """Allocate a floating ip on the external network and associate it
+    with the port of a server.
+
+    :return: the floating ip address.
+    """
+    conn = _connection()
+    external = conn.network.find_network('external', ignore_missing=False)
+    port = next(conn.network.ports(device_id=server_id), None)
+    if port is None:
+        raise RuntimeError(f'Server {server_id} has no port to associate'
+                           ' a floating ip with.')
+    ip = conn.network.create_ip(floating_network_id=external.id,
+                                port_id=port.id)
+    return ip.floating_ip_address
 
 
 def check_server(name, server_id, args):
@@ -109,16 +174,16 @@ def check_server(name, server_id, args):
     retries = 0
     max_retries = 10
 
-    waits = 0
-    max_waits = 1000  # 100 seconds + ~1000 calls to `openstack server list`.
+    # Poll the status of our server only, backing off exponentially.
+    interval = BUILD_MIN_INTERVAL
+    deadline = time.monotonic() + BUILD_TIMEOUT
+    waiting = False
 
     while True:
-        status_ = check_output('openstack', 'server', 'list',
-                               '--format', 'json')
-        status_ = json.loads(status_)
-        for server in status_:
-            if server['ID'] == server_id:
-                status = server['Status']
+        server = _connection().compute.find_server(
+            server_id, ignore_missing=True)
+        if server is not None:
+            status = server.status
 
         if not status:
             # Something went wrong ...
@@ -128,13 +193,14 @@ def check_server(name, server_id, args):
             # Just return BUILD or ACTIVE or Unknown.
             break
 
-        if waits < 1:
+        if not waiting:
             print("Waiting for server to build ...")
+            waiting = True
 
         if status == 'BUILD':
-            if waits <= max_waits:
-                waits += 1
-                time.sleep(0.1)
+            if time.monotonic() < deadline:
+                time.sleep(interval)
+                interval = min(interval * 2, BUILD_MAX_INTERVAL)
                 continue
             # Looks like we're stuck! Fall through to ERROR check
             # below.
@@ -147,7 +213,10 @@ def check_server(name, server_id, args):
             print('Ran into an error launching server. Retrying ...')
             delete_server(server_id)
             server_id = create_server(name, args)
-            waits = 0  # Reset waits
+            # Reset waits
+            interval = BUILD_MIN_INTERVAL
+            deadline = time.monotonic() + BUILD_TIMEOUT
+            waiting = False
             retries += 1
             continue
 
@@ -160,6 +229,11 @@ def check_server(name, server_id, args):
 def launch(name, args):
     """Launch a server!"""
 
+    # Fetch all config values used below at once.
+    config_get('config.credentials.key-pair',
+               'config.network.ext-gateway',
+               'config.network.ports.dashboard')
+
     if args.key == 'microstack':
         # Make sure that we have a default ssh key to hand off to the
         # instance.
@@ -181,9 +255,7 @@ def launch(name, args):
         sys.exit(1)
 
     print('Allocating floating ip ...')
-    ip = check_output('openstack', 'floating', 'ip', 'create', '-f', 'value',
-                      '-c', 'floating_ip_address', 'external')
-    check('openstack', 'server', 'add', 'floating', 'ip', server_id, ip)
+    ip = add_floating_ip(server_id)
 
     # We've launched! Make some guesses about usernames and the
     # location of the ssh key in the operator's system, so we can tell
@@ -204,8 +276,8 @@ Access it with `ssh -i {key_path} {username}@{ip}`\
 """.format(name=name, status=status, key_path=key_path,
            username=username, ip=ip))
 
-    gate = check_output('snapctl', 'get', 'config.network.ext-gateway')
-    port = check_output('snapctl', 'get', 'config.network.ports.dashboard')
+    gate = config_get('config.network.ext-gateway')
+    port = config_get('config.network.ports.dashboard')
 
     print('You can also visit the OpenStack dashboard at http://{}:{}'.format(
         gate, port))
@@ -219,15 +291,15 @@ def main():
         'petname', '-d', '{}/usr/share/petname'.format(
             os.environ.get('SNAP', '')))
 
-    # Parse microstack.rc
+    # Parse microstack.rc. shlex takes care of quoted values and values
+    # containing '='.
     # TODO: we need a share lib that does this in a more robust way.
     mstackrc = '{SNAP_COMMON}/etc/microstack.rc'.format(**os.environ)
     with open(mstackrc, 'r') as rc_file:
-        for line in rc_file.readlines():
-            if not line.startswith('export'):
-                continue
-            key, val = line[7:].split('=')
-            os.environ[key.strip()] = val.strip()
+        os.environ.update(
+            token.split('=', 1)
+            for token in shlex.split(rc_file.read(), comments=True)
+            if '=' in token)
 
     return launch(name, args)
 
@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 
 import argparse
+import importlib
 import sys
 
-import launch.main
-import cluster.add_compute
-import init.main
+
+# The module and function implementing each command. Only the module of
+# the command being run is imported since each one pulls in a different
+# set of dependencies.
+COMMANDS = {
+    'init': ('init.main', 'init'),
+    'add-compute': ('cluster.add_compute', 'main'),
+    'launch': ('launch.main', 'main'),
+}
 
 
 def main():
@@ -25,17 +32,13 @@ Available commands:
                         ' {init, launch, add-compute}')
     args = parser.parse_args(sys.argv[1:2])
 
-    COMMANDS = {
-        'init': init.main.init,
-        'add-compute': cluster.add_compute.main,
-        'launch': launch.main.main
-    }
-
-    cmd = COMMANDS.get(args.command, None)
-    if cmd is None:
+    if args.command not in COMMANDS:
         parser.print_help()
         raise Exception('Unrecognized command')
 
+    module, function = COMMANDS[args.command]
+    cmd = getattr(importlib.import_module(module), function)
+
     # TODO: Implement this properly via subparsers and get rid of
     # extra modules.
     sys.argv[0] = sys.argv[1]
@@ -14,7 +14,7 @@ inspect the updates and check in the file yourself!
 """
 
 import os
-import shutil
+import re
 import sys
 
 
@@ -31,6 +31,9 @@ PATH = (
     '$SNAP/bin',
     '$PATH')
 
+# Matches the value of the settings above at the top level of environment.
+SETTING_RE = re.compile(r'^(  (LD_LIBRARY_PATH|PATH): ).*$', re.MULTILINE)
+
 
 def main():
     """Replace PATH and LD_LIBRARY_PATH with lists above.
@@ -52,21 +55,27 @@ def main():
     print('snapcraft.yaml found in the current working dir. '
           'Updating LD_LIBRARY_PATH and PATH ...')
 
-    libs = ':'.join(LD_LIBRARY_PATH)
-    path_ = ':'.join(PATH)
+    values = {
+        'LD_LIBRARY_PATH': ':'.join(LD_LIBRARY_PATH),
+        'PATH': ':'.join(PATH),
+    }
 
     with open('./snapcraft.yaml', 'r') as source:
-        with open('./snapcraft.yaml.updated', 'w') as dest:
-            lines = source.readlines()
-            for line in lines:
-                if line.startswith('  LD_LIBRARY_PATH: '):
-                    line = '  LD_LIBRARY_PATH: {}\n'.format(libs)
-                if line.startswith('  PATH: '):
-                    line = '  PATH: {}\n'.format(path_)
+        yaml = source.read()
+
+    # Rewrite all of the matching lines in a single pass over the file.
+    yaml = SETTING_RE.sub(
+        lambda match: '{}{}'.format(match.group(1), values[match.group(2)]),
+        yaml)
 
-                dest.write(line)
+    # Write the updated file next to the original and rename it over the
+    # original so that an interrupted run cannot leave it half written.
+    with open('./snapcraft.yaml.updated', 'w') as dest:
+        dest.write(yaml)
+        dest.flush()
+        os.fsync(dest.fileno())
 
-    shutil.move('./snapcraft.yaml.updated', './snapcraft.yaml')
+    os.replace('./snapcraft.yaml.updated', './snapcraft.yaml')
 
     print('File updated! Please manually inspect the changes '
           'and commit them via git.')